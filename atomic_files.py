@@ -0,0 +1,32 @@
+# atomic_files.py
+# writes files next to their destination and renames them into place once complete, so an
+# interrupted run never leaves a truncated file for the next run or the page to read.
+
+import os
+import json
+import contextlib
+
+@contextlib.contextmanager
+def atomic_open(path, mode='w'):
+    """
+    Open a temporary file next to path for writing, and rename it to path when the block completes.
+    The temporary file is removed instead when the block raises.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+def write_json(path, data, **kwargs):
+    """
+    Write data to path as JSON, atomically. kwargs are passed to json.dump.
+    """
+    with atomic_open(path) as f:
+        json.dump(data, f, **kwargs)
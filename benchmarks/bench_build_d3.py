@@ -0,0 +1,99 @@
+# bench_build_d3.py
+# compares the old iterrows-based edge processing in build_d3 with the columnar one.
+# run from the repository root: python -m benchmarks.bench_build_d3 [num_edges]
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from build_d3 import records_from_dataframe, format_text_output, build_theme_graph
+
+def make_synthetic_flows(num_edges, num_programs=50_000, seed=0):
+    """
+    Build a DataFrame shaped like the build_d3 query result over a synthetic program_dependencies table.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array([f"P{i}" for i in range(num_programs)], dtype=object)
+    themes = np.array(['Autonomy', 'Sensing', 'Comms', 'Energy', None], dtype=object)
+    funding = np.round(rng.uniform(0, 500, size=num_programs), 2)
+    funding[rng.random(num_programs) < 0.05] = np.nan
+
+    source = rng.integers(0, num_programs, size=num_edges)
+    target = rng.integers(0, num_programs, size=num_edges)
+    source_funding = funding[source]
+    target_funding = funding[target]
+    return pd.DataFrame({
+        'source': names[source],
+        'target': names[target],
+        'source_org': 'Org',
+        'source_name': names[source],
+        'target_name': names[target],
+        'source_funding': source_funding,
+        'target_funding': target_funding,
+        'value': np.where(np.isnan(source_funding), target_funding, source_funding),
+        'source_theme': themes[source % len(themes)],
+        'target_theme': themes[target % len(themes)],
+        'source_companies': 'Company A, Company B',
+        'source_description': 'Synthetic program',
+    })
+
+def legacy_process(df):
+    """
+    The row-by-row loop that build_d3 used before the columnar rewrite.
+    """
+    data = []
+    text_output = []
+    for _, row in df.iterrows():
+        data.append({
+            "source": row['source'],
+            "target": row['target'],
+            "source_funding": row['source_funding'],
+            "target_funding": row['target_funding'],
+            "value": row['value'],
+            "source_theme": row['source_theme'],
+            "target_theme": row['target_theme'],
+            "source_companies": row['source_companies'],
+            "source_description": row['source_description'],
+            "source_name": row['source_name'],
+            "target_name": row['target_name'],
+            "source_org": row['source_org']
+        })
+        if row['source']:
+            text_output.append(f"{row['source']} (Source Funding: {row['source_funding']}) -> {row['target']} (Target Funding: {row['target_funding']}) [{row['value']}] Source Theme: {row['source_theme']}, Target Theme: {row['target_theme']}")
+        else:
+            text_output.append(f"{row['target']} [{row['value']}] Source Theme: {row['source_theme']}, Target Theme: {row['target_theme']}")
+    return data, text_output
+
+if __name__ == "__main__":
+    num_edges = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = make_synthetic_flows(num_edges)
+
+    start = time.perf_counter()
+    legacy_data, legacy_text = legacy_process(df)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    data = records_from_dataframe(df)
+    records_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    text_output = format_text_output(df)
+    text_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    theme_graphs = [build_theme_graph(edges) for _, edges in df.groupby('source_theme', dropna=False, sort=False)]
+    theme_seconds = time.perf_counter() - start
+
+    # The columnar output matches the old one, apart from NaN now being written as null
+    assert len(data) == len(legacy_data) and text_output == legacy_text
+    assert all(
+        (value is None and pd.isna(legacy_data[i][key])) or value == legacy_data[i][key]
+        for i in range(0, num_edges, max(1, num_edges // 1000))
+        for key, value in data[i].items()
+    )
+
+    print(f"edges: {num_edges}")
+    print(f"legacy (iterrows, with text): {legacy_seconds:.2f}s")
+    print(f"columnar records:             {records_seconds:.2f}s ({legacy_seconds / records_seconds:.1f}x)")
+    print(f"columnar text output:         {text_seconds:.2f}s")
+    print(f"theme nodes/links ({len(theme_graphs)} themes): {theme_seconds:.2f}s")
@@ -0,0 +1,78 @@
+# bench_company_tables.py
+# compares the old iterrows-based company explosion with the vectorized one in data_formatter.
+# run from the repository root: python -m benchmarks.bench_company_tables [num_programs]
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from data_formatter import explode_program_companies, map_program_companies
+
+def make_synthetic_sheet(num_programs, num_companies=5000, seed=0):
+    """
+    Build a sheet-like DataFrame with 0-5 comma-separated companies per program.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Company {i}" for i in range(num_companies)])
+    counts = rng.integers(0, 6, size=num_programs)
+    picks = rng.integers(0, num_companies, size=counts.sum())
+    splits = np.split(picks, np.cumsum(counts)[:-1])
+    companies = [', '.join(names[p]) if len(p) else None for p in splits]
+    return pd.DataFrame({'id': np.arange(1, num_programs + 1), 'companies': companies})
+
+def legacy_company_rows(df, company_map):
+    """
+    The row-by-row implementation that create_and_populate_company_tables used before vectorization.
+    """
+    company_names = set()
+    program_company_rows = []
+    for _, row in df.iterrows():
+        program_id = row['id']
+        companies = row.get('companies', '')
+        if pd.notna(companies):
+            for company in set(companies.split(',')):
+                company = company.strip()
+                if company:
+                    company_names.add(company)
+                    program_company_rows.append({'program_id': program_id, 'company_name': company})
+
+    program_company_rows_mapped = [
+        {'program_id': row['program_id'], 'company_id': company_map.get(row['company_name'])}
+        for row in program_company_rows
+        if row['company_name'] in company_map
+    ]
+    valid_program_company_rows = [row for row in program_company_rows_mapped if row['company_id'] is not None]
+    return company_names, pd.DataFrame(valid_program_company_rows).drop_duplicates()
+
+def vectorized_company_rows(df, company_map_df):
+    program_company_names_df = explode_program_companies(df)
+    company_names = program_company_names_df['company_name'].unique()
+    return company_names, map_program_companies(program_company_names_df, company_map_df)
+
+if __name__ == "__main__":
+    num_programs = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    df = make_synthetic_sheet(num_programs)
+
+    # Stand in for the ids the company table would assign
+    company_map_df = pd.DataFrame({'name': explode_program_companies(df)['company_name'].unique()})
+    company_map_df['id'] = np.arange(1, len(company_map_df) + 1)
+    company_map = dict(zip(company_map_df['name'], company_map_df['id']))
+
+    start = time.perf_counter()
+    legacy_names, legacy_df = legacy_company_rows(df, company_map)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    names, program_company_df = vectorized_company_rows(df, company_map_df)
+    vectorized_seconds = time.perf_counter() - start
+
+    # Both implementations must produce the same companies and associations
+    assert set(names) == legacy_names
+    key = ['program_id', 'company_id']
+    assert legacy_df.sort_values(key).reset_index(drop=True).equals(
+        program_company_df.astype(legacy_df.dtypes.to_dict()).sort_values(key).reset_index(drop=True))
+
+    print(f"programs: {num_programs}, companies: {len(names)}, associations: {len(program_company_df)}")
+    print(f"legacy (iterrows):  {legacy_seconds:.2f}s")
+    print(f"vectorized (explode): {vectorized_seconds:.2f}s")
+    print(f"speedup: {legacy_seconds / vectorized_seconds:.1f}x")
@@ -0,0 +1,37 @@
+# bench_import_time.py
+# measures the import (startup) time of each entry point, with the Google client libraries
+# loaded lazily (current) and eagerly (as db_connection used to import them).
+# run from the repository root: python -m benchmarks.bench_import_time [repeats]
+
+import sys
+import subprocess
+
+# Entry point scripts measured, by module name
+ENTRY_POINTS = ['get_data', 'build_d3', 'find_orphans', 'import_neo4j']
+
+# The imports db_connection used to run at module level
+EAGER_GOOGLE_IMPORTS = "import google.oauth2.service_account, googleapiclient.discovery; "
+
+def time_import(module, preload=''):
+    """
+    Return the time to import a module in a fresh interpreter, optionally after running preload.
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"{preload}import {module}; "
+        "print(time.perf_counter() - start)"
+    )
+    return float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout)
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f"{'entry point':<14} {'lazy':>8} {'eager':>8} {'saved':>8}")
+    for module in ENTRY_POINTS:
+        # Alternate the two variants and keep the best run of each, which is the least noisy estimate
+        lazy_runs, eager_runs = [], []
+        for _ in range(repeats):
+            lazy_runs.append(time_import(module))
+            eager_runs.append(time_import(module, preload=EAGER_GOOGLE_IMPORTS))
+        lazy, eager = min(lazy_runs), min(eager_runs)
+        print(f"{module:<14} {lazy * 1000:>6.0f}ms {eager * 1000:>6.0f}ms {(eager - lazy) * 1000:>6.0f}ms")
@@ -1,89 +1,280 @@
+import os
+import re
+import hashlib
+import argparse
 import pandas as pd
 import json
-from db_connection import get_postgres_engine
-
-def extract_and_process_data():
-    """
-    Extract data from PostgreSQL using a direct SQL query, process it, and prepare for Sankey diagram.
-    """
-    # Initialize PostgreSQL connection using db_connection module
-    engine = get_postgres_engine()
-
-    # SQL query to extract source, target, source funding, target funding, value, and themes
-    query = """
-            SELECT 
-                source_program.short_name AS source,
-                target_program.short_name AS target,
-                source_program.org AS source_org,
-                source_program.program_name AS source_name,
-                target_program.program_name AS target_name,
-                source_program.total_funding_m AS source_funding,
-                target_program.total_funding_m AS target_funding,
-                COALESCE(source_program.total_funding_m, target_program.total_funding_m) AS value,
-                source_program.theme AS source_theme,
-                target_program.theme AS target_theme,
-                source_program.companies AS source_companies,
-                source_program.description AS source_description
-            FROM 
-                program_dependencies
-            JOIN 
-                all_programs AS source_program ON program_dependencies.dependency_id = source_program.id
-            JOIN 
-                all_programs AS target_program ON program_dependencies.program_id = target_program.id;
-    """
-    
-    # Execute the SQL query
-    df = pd.read_sql(query, engine)
-
-    # Initialize data structures for output
-    data = []
-    text_output = []
-    
-    # Process each row to build the relationship and funding flow
-    for _, row in df.iterrows():
-        source = row['source']
-        target = row['target']
-        source_funding = row['source_funding']
-        target_funding = row['target_funding']
-        value = row['value']
-        source_theme = row['source_theme']
-        target_theme = row['target_theme']
-        source_companies = row['source_companies']
-        source_description = row['source_description']
-        source_name = row['source_name']
-        target_name = row['target_name']
-        source_org = row['source_org']
-        
-        # Append to list for JSON output
-        data.append({
-            "source": source,
-            "target": target,
-            "source_funding": source_funding,
-            "target_funding": target_funding,
-            "value": value,
-            "source_theme": source_theme,
-            "target_theme": target_theme,
-            "source_companies": source_companies,
-            "source_description": source_description,
-            "source_name": source_name,
-            "target_name": target_name,
-            "source_org": source_org
+import logging
+from sqlalchemy import text
+from db_connection import get_postgres_engine, postgres_engine_scope
+from sankey_layout import add_sankey_layout
+from atomic_files import atomic_open, write_json
+
+# SQL query to extract source, target, source funding, target funding, value, and themes
+FLOW_QUERY = """
+        SELECT
+            source_program.short_name AS source,
+            target_program.short_name AS target,
+            source_program.org AS source_org,
+            source_program.program_name AS source_name,
+            target_program.program_name AS target_name,
+            source_program.total_funding_m AS source_funding,
+            target_program.total_funding_m AS target_funding,
+            COALESCE(source_program.total_funding_m, target_program.total_funding_m) AS value,
+            source_program.theme AS source_theme,
+            target_program.theme AS target_theme,
+            source_program.companies AS source_companies,
+            source_program.description AS source_description
+        FROM
+            program_dependencies
+        JOIN
+            all_programs AS source_program ON program_dependencies.dependency_id = source_program.id
+        JOIN
+            all_programs AS target_program ON program_dependencies.program_id = target_program.id
+        ORDER BY
+            source_program.theme, program_dependencies.program_id, program_dependencies.dependency_id;
+"""
+
+# Number of edges fetched per round trip when streaming the query result
+STREAM_CHUNK_SIZE = 10_000
+
+# Directory holding the per-theme flow data shards and their manifest
+FLOW_SHARD_DIR = 'flow_data'
+MANIFEST_FILE = 'manifest.json'
+
+# Fields of each edge in flow_data.json, in output order
+FLOW_FIELDS = [
+    'source', 'target', 'source_funding', 'target_funding', 'value', 'source_theme', 'target_theme',
+    'source_companies', 'source_description', 'source_name', 'target_name', 'source_org'
+]
+
+# Fields of the nodes and links in each theme shard, in output order
+NODE_FIELDS = [
+    'name', 'fundingIn', 'fundingOut', 'targetFunding',
+    'source_companies', 'source_description', 'source_name', 'source_org'
+]
+LINK_FIELDS = [
+    'source', 'target', 'value', 'source_funding', 'target_funding',
+    'source_description', 'source_companies', 'source_name', 'source_org'
+]
+
+# Text fields of a link that fall back to "no data" when missing or empty
+LINK_TEXT_FIELDS = ['source_description', 'source_companies', 'source_name', 'source_org']
+
+def records_from_dataframe(df, fields=FLOW_FIELDS):
+    """
+    Convert the query result into a list of edge dicts for JSON output, with missing values as null.
+    Works column by column, which is much faster than DataFrame.to_dict(orient='records').
+    """
+    columns = []
+    for field in fields:
+        values = df[field].tolist()
+        missing = df[field].isna().to_numpy()
+        if missing.any():
+            values = [None if is_missing else value for value, is_missing in zip(values, missing)]
+        columns.append(values)
+
+    return [dict(zip(fields, row)) for row in zip(*columns)]
+
+def build_theme_graph(edges):
+    """
+    Build the Sankey {nodes, links} structure for the edges of one theme.
+    Nodes are the source and target names in order of first appearance. A node's descriptive fields
+    come from the source side of the first edge that touches it, fundingIn and fundingOut sum the
+    values of its inbound and outbound edges, and targetFunding is the target_funding of its last
+    inbound edge. Links refer to nodes by index.
+    """
+    edges = edges.reset_index(drop=True)
+
+    # Interleave source and target per edge so drop_duplicates keeps the order names are first seen
+    endpoints = pd.DataFrame({
+        'name': pd.concat([edges['source'], edges['target']]).sort_index(kind='stable').to_numpy(),
+        'edge': edges.index.repeat(2),
+    }).drop_duplicates('name')
+    node_index = pd.Index(endpoints['name'])
+    source_index = node_index.get_indexer(edges['source'])
+    target_index = node_index.get_indexer(edges['target'])
+
+    # Every node takes its descriptive fields from the first edge touching it
+    nodes = edges.loc[endpoints['edge'], ['source_companies', 'source_description', 'source_name', 'source_org']].reset_index(drop=True)
+    nodes.insert(0, 'name', endpoints['name'].to_numpy())
+
+    value = edges['value'].fillna(0)
+    node_range = pd.RangeIndex(len(node_index))
+    nodes['fundingOut'] = value.groupby(source_index).sum().reindex(node_range, fill_value=0).to_numpy()
+    nodes['fundingIn'] = value.groupby(target_index).sum().reindex(node_range, fill_value=0).to_numpy()
+    last_inbound = pd.Series(edges['target_funding'].to_numpy(), index=target_index).groupby(level=0).nth(-1)
+    nodes['targetFunding'] = last_inbound.reindex(node_range).fillna(0).to_numpy()
+
+    links = pd.DataFrame({
+        'source': source_index,
+        'target': target_index,
+        'value': edges['value'],
+        'source_funding': edges['source_funding'].fillna(0),
+        'target_funding': edges['target_funding'].fillna(0),
+    })
+    for field in LINK_TEXT_FIELDS:
+        links[field] = edges[field].where(edges[field].notna() & (edges[field] != ''), 'no data')
+
+    return {'nodes': records_from_dataframe(nodes, NODE_FIELDS), 'links': records_from_dataframe(links, LINK_FIELDS)}
+
+def format_text_output(df):
+    """
+    Build the human-readable relationship lines for each edge.
+    """
+    def as_text(column):
+        return df[column].astype(str)
+
+    themes = " Source Theme: " + as_text('source_theme') + ", Target Theme: " + as_text('target_theme')
+    with_source = (as_text('source') + " (Source Funding: " + as_text('source_funding') + ") -> "
+                   + as_text('target') + " (Target Funding: " + as_text('target_funding') + ") ["
+                   + as_text('value') + "]" + themes)
+    without_source = as_text('target') + " [" + as_text('value') + "]" + themes
+
+    has_source = df['source'].notna() & (df['source'] != '')
+    return with_source.where(has_source, without_source).tolist()
+
+def iter_flow_chunks(engine, chunksize=STREAM_CHUNK_SIZE):
+    """
+    Yield the query result as DataFrame chunks, read through a server-side cursor.
+    """
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True, yield_per=chunksize)
+        for chunk in pd.read_sql(text(FLOW_QUERY), conn, chunksize=chunksize):
+            yield chunk
+
+def theme_file_name(theme, used_names):
+    """
+    Return a unique, filesystem-safe shard file name for a theme.
+    """
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', str(theme)).strip('_').lower() if theme is not None else ''
+    slug = slug or 'unthemed'
+    file_name = f"{slug}.json"
+    suffix = 2
+    while file_name in used_names:
+        file_name = f"{slug}_{suffix}.json"
+        suffix += 1
+    used_names.add(file_name)
+    return file_name
+
+def theme_key(theme):
+    """
+    Normalize a theme value so missing themes (None or NaN) share one key.
+    """
+    return None if pd.isna(theme) else theme
+
+class ThemeShardWriter:
+    """
+    Writes one {nodes, links, layout} JSON file per source_theme and a manifest with the theme, edge count,
+    byte size and content hash of every shard. Edges must arrive grouped by theme (FLOW_QUERY orders
+    them so), which lets each theme be written as soon as the next one starts.
+    """
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+        self.entries = []
+        self.used_names = set()
+        self.pending = {}
+        self.written = set()
+        os.makedirs(shard_dir, exist_ok=True)
+
+    def add(self, chunk):
+        """
+        Add a DataFrame chunk of edges, writing out every theme that the chunk shows to be complete.
+        """
+        if chunk.empty:
+            return
+        for theme, edges in chunk.groupby('source_theme', dropna=False, sort=False):
+            theme = theme_key(theme)
+            if theme in self.written:
+                raise ValueError(f"Edges of theme {theme!r} arrived after the theme was written; order the rows by source_theme")
+            self.pending.setdefault(theme, []).append(edges)
+
+        # Rows are ordered by theme, so only the chunk's last theme can continue in the next chunk
+        current = theme_key(chunk['source_theme'].iloc[-1])
+        for theme in [theme for theme in self.pending if theme != current]:
+            self._write_theme(theme)
+
+    def _write_theme(self, theme):
+        edges = pd.concat(self.pending.pop(theme), ignore_index=True)
+        self.written.add(theme)
+        file_name = theme_file_name(theme, self.used_names)
+
+        graph = build_theme_graph(edges)
+        try:
+            add_sankey_layout(graph)
+        except ValueError as e:
+            # The page lays the theme out itself, and reports the problem, when there is no layout
+            logging.warning(f"Could not lay out theme {theme!r}: {e}")
+            graph['layout'] = None
+
+        data = json.dumps({'theme': theme, **graph}, separators=(',', ':'), allow_nan=False).encode('utf-8')
+        with atomic_open(os.path.join(self.shard_dir, file_name), 'wb') as f:
+            f.write(data)
+
+        self.entries.append({
+            'theme': theme,
+            'file': file_name,
+            'edges': len(edges),
+            'bytes': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
         })
-        
-        # Prepare text output correctly
-        if source:
-            text_output.append(f"{source} (Source Funding: {source_funding}) -> {target} (Target Funding: {target_funding}) [{value}] Source Theme: {source_theme}, Target Theme: {target_theme}")
-        else:
-            text_output.append(f"{target} [{value}] Source Theme: {source_theme}, Target Theme: {target_theme}")
-
-    # Display the text output
-    print("\n".join(text_output))
-    
-    return data
-
-# Get the processed data
-sankey_data = extract_and_process_data()
-
-# Save the data to a JSON file for D3.js consumption
-with open('flow_data.json', 'w') as f:
-    json.dump(sankey_data, f, indent=4)  # Pretty print JSON for better readability
+
+    def close(self):
+        """
+        Write the remaining themes, remove shards of themes that no longer exist and write the manifest.
+        Returns the manifest entries.
+        """
+        for theme in list(self.pending):
+            self._write_theme(theme)
+
+        for file_name in os.listdir(self.shard_dir):
+            if file_name.endswith('.json') and file_name != MANIFEST_FILE and file_name not in self.used_names:
+                os.remove(os.path.join(self.shard_dir, file_name))
+
+        write_json(os.path.join(self.shard_dir, MANIFEST_FILE),
+                   {'edges': sum(entry['edges'] for entry in self.entries), 'themes': self.entries}, indent=4)
+        return self.entries
+
+def write_flow_data(chunks, path, shard_dir=None, print_text=False):
+    """
+    Write the edges as a JSON array one element at a time, so memory stays flat regardless of the number of edges.
+    The file is written next to its destination and renamed into place once complete. With shard_dir,
+    per-theme {nodes, links} shards and a manifest are written in the same pass, holding only one
+    theme's edges in memory at a time. Returns the edge count.
+    """
+    count = 0
+    shards = ThemeShardWriter(shard_dir) if shard_dir else None
+    with atomic_open(path) as f:
+        f.write('[')
+        for chunk in chunks:
+            # Display the text output
+            if print_text:
+                print("\n".join(format_text_output(chunk)))
+
+            for record in records_from_dataframe(chunk):
+                f.write(',\n' if count else '\n')
+                f.write(json.dumps(record))
+                count += 1
+            if shards is not None:
+                shards.add(chunk)
+        f.write('\n]\n')
+
+    if shards is not None:
+        shards.close()
+    return count
+
+def main(argv=None):
+    """
+    Export the flow data for the Sankey page: flow_data.json plus the per-theme shards.
+    """
+    parser = argparse.ArgumentParser(description="Export program dependency flows for the Sankey diagram.")
+    parser.add_argument('--text', action='store_true', help="Print a text line for every dependency edge.")
+    args = parser.parse_args(argv)
+
+    # Stream the processed data to JSON files for D3.js consumption
+    with postgres_engine_scope():
+        edge_count = write_flow_data(iter_flow_chunks(get_postgres_engine()), 'flow_data.json', shard_dir=FLOW_SHARD_DIR, print_text=args.text)
+    print(f"Wrote {edge_count} edges to flow_data.json and per-theme shards to {FLOW_SHARD_DIR}/")
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import logging
 from sqlalchemy import text
@@ -5,23 +9,188 @@ from sqlalchemy import text
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def create_and_populate_all_programs_table(df, engine):
+# Marker written for missing values in the COPY stream, so that empty strings stay empty strings
+COPY_NULL = r'\N'
+
+def qualified_name(table_name, schema=None):
+    """
+    Return the table name prefixed with its schema, if one is given.
+    """
+    return f"{schema}.{table_name}" if schema else table_name
+
+def copy_dataframe(df, table_name, dbapi_conn):
+    """
+    Stream a DataFrame into an existing table with COPY FROM STDIN (CSV).
+    Runs on a raw DBAPI (psycopg2) connection and leaves committing to the caller.
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+
+    columns = ', '.join(f'"{col}"' for col in df.columns)
+    copy_sql = f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+    with dbapi_conn.cursor() as cursor:
+        cursor.copy_expert(copy_sql, buffer)
+
+def bulk_load_dataframe(df, table_name, engine, schema=None):
+    """
+    Append a DataFrame to a PostgreSQL table using COPY, falling back to
+    DataFrame.to_sql(method='multi') when COPY is unavailable or fails.
+    """
+    start = time.perf_counter()
+    method = 'COPY'
+
+    dbapi_conn = engine.raw_connection()
+    try:
+        copy_dataframe(df, qualified_name(table_name, schema), dbapi_conn)
+        dbapi_conn.commit()
+    except Exception as e:
+        dbapi_conn.rollback()
+        logging.warning(f"COPY into {table_name} failed ({e}); falling back to multi-row INSERT.")
+        method = 'INSERT'
+        df.to_sql(table_name, engine, schema=schema, if_exists='append', index=False, method='multi', chunksize=1000)
+    finally:
+        dbapi_conn.close()
+
+    elapsed = time.perf_counter() - start
+    rows_per_sec = len(df) / elapsed if elapsed > 0 else float('inf')
+    logging.info(f"Loaded {len(df)} rows into {qualified_name(table_name, schema)} via {method} in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec).")
+
+# Columns of the all_programs table that are populated from the sheet
+ALL_PROGRAMS_COLUMNS = [
+    'id', 'program_name', 'short_name', 'org', 'description', 'impact', 'status',
+    'companies', 'total_funding_m', 'start_year', 'end_year', 'dependency',
+    'theme', 'importance', 'notes_with_applied', 'num_companies'
+]
+
+def table_exists(conn, table_name):
+    """
+    Return True if the given table exists in the current search path.
+    """
+    return conn.execute(text("SELECT to_regclass(:name)"), {'name': table_name}).scalar() is not None
+
+# dtypes the row hash is computed with; every other column is hashed as object. Pinning them keeps a
+# row's hash independent of the other rows, e.g. 5 and 5.0 in a column inferred as int64 or float64.
+ROW_HASH_DTYPES = {
+    'id': 'int64', 'total_funding_m': 'float64', 'start_year': 'datetime64[ns]',
+    'end_year': 'datetime64[ns]', 'num_companies': 'int64'
+}
+
+def add_row_hash(df):
+    """
+    Add a 'row_hash' column fingerprinting the content of each row, used to detect changed programs.
+    """
+    hash_columns = [col for col in df.columns if col != 'row_hash']
+    hashed = df[hash_columns].astype({col: ROW_HASH_DTYPES.get(col, 'object') for col in hash_columns})
+    df['row_hash'] = pd.util.hash_pandas_object(hashed, index=False).map('{:016x}'.format)
+    return df
+
+def prepare_all_programs_dataframe(df):
+    """
+    Rename, validate and clean the sheet DataFrame into the shape of the 'all_programs' table.
+    """
+    # Rename columns to match database schema
+    df.rename(columns={
+        'Program Name': 'program_name',
+        'Short Name': 'short_name',
+        'Org': 'org',
+        'Description': 'description',
+        'Impact': 'impact',
+        'Status': 'status',
+        'Companies': 'companies',
+        'Total Funding (m)': 'total_funding_m',
+        'Start Year': 'start_year',
+        'End Year': 'end_year',
+        'Dependency': 'dependency',
+        'Theme': 'theme',
+        'Importance': 'importance',
+        'Notes with Applied': 'notes_with_applied'
+    }, inplace=True)
+
+    # Clean DataFrame
+    df = df.dropna(how='all')  # Remove completely empty rows
+    df.columns = df.columns.str.strip()  # Strip any leading/trailing spaces from column names
+    logging.info(f"Columns available in the DataFrame: {df.columns.tolist()}")
+
+    # Validate 'id' column
+    if 'id' not in df.columns:
+        logging.error("'id' column is missing from the DataFrame.")
+        raise KeyError("'id' column is missing.")
+
+    if df['id'].isnull().any():
+        logging.error("Some rows have null IDs, which may cause issues.")
+        logging.error(f"Problematic rows:\n{df[df['id'].isnull()]}")
+        raise ValueError("Null IDs found.")
+
+    if not df['id'].apply(lambda x: str(x).isdigit()).all():
+        logging.error("Some rows have non-integer IDs.")
+        logging.error(f"Problematic rows:\n{df[~df['id'].apply(lambda x: str(x).isdigit())]}")
+        raise ValueError("Non-integer IDs found.")
+
+    df['id'] = pd.to_numeric(df['id'], errors='coerce').astype(int)
+
+    # Check for duplicate IDs
+    duplicates = df[df.duplicated(subset='id', keep=False)]
+    if not duplicates.empty:
+        logging.error(f"Duplicate IDs found: {duplicates['id'].tolist()}")
+        raise ValueError(f"Duplicate IDs detected: {duplicates['id'].tolist()}")
+
+    # Ensure 'total_funding_m' column exists
+    if 'total_funding_m' not in df.columns:
+        logging.error("'total_funding_m' column is missing from the DataFrame.")
+        raise KeyError("'total_funding_m' column is missing.")
+
+    # Clean 'total_funding_m' column
+    df['total_funding_m'] = df['total_funding_m'].replace({r'[^\d.]': ''}, regex=True)
+    df['total_funding_m'] = pd.to_numeric(df['total_funding_m'], errors='coerce').astype('float64')
+
+    # Convert start_year and end_year from integers to full dates
+    df['start_year'] = pd.to_datetime(df['start_year'].astype(str) + '-01-01', errors='coerce')
+    df['end_year'] = pd.to_datetime(df['end_year'].astype(str) + '-12-31', errors='coerce')
+
+
+    # we need to calculate the number of companies
+    #df['num_companies'] = df['companies'].str.split(',').apply(lambda x: len(x) if pd.notna(x) else 0)
+    df['num_companies'] = df['companies'].apply(lambda x: len(x.split(',')) if pd.notna(x) else 0)
+
+    # Log rows where 'total_funding_m' is missing or invalid
+    invalid_funding = df[df['total_funding_m'].isnull()]
+    if not invalid_funding.empty:
+        logging.warning(f"Invalid or missing 'total_funding_m' in rows: {invalid_funding[['id', 'total_funding_m']].to_dict(orient='records')}")
+
+    # Process 'Start Year' and 'End Year'
+    for date_col in ['start_year', 'end_year']:
+        if date_col in df.columns:
+            df[date_col] = pd.to_datetime(df[date_col], format='%Y', errors='coerce')
+        else:
+            logging.warning(f"'{date_col}' column is missing from the DataFrame.")
+            df[date_col] = pd.NaT
+
+    # Select only the columns that exist in the DataFrame to avoid KeyErrors
+    existing_columns = [col for col in ALL_PROGRAMS_COLUMNS if col in df.columns]
+    df = df[existing_columns].copy()
+
+    return add_row_hash(df)
+
+def create_and_populate_all_programs_table(df, engine, schema=None):
     """
     Create and populate the 'all_programs' table in the PostgreSQL database.
+    Returns the loaded program ids as a pandas Index, for the foreign key checks of the later stages.
     """
+    all_programs = qualified_name('all_programs', schema)
     try:
         with engine.connect() as conn:
             # Drop existing tables to reset the environment
-            conn.execute(text("DROP TABLE IF EXISTS program_company CASCADE"))
-            conn.execute(text("DROP TABLE IF EXISTS program_dependencies CASCADE"))
-            conn.execute(text("DROP TABLE IF EXISTS all_programs CASCADE"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {qualified_name('program_company', schema)} CASCADE"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {qualified_name('program_dependencies', schema)} CASCADE"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {all_programs} CASCADE"))
             conn.commit()
             logging.info("Dropped existing tables: program_company, program_dependencies, all_programs.")
 
         with engine.connect() as conn:
             # Create the all_programs table
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS all_programs (
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {all_programs} (
                     id SERIAL PRIMARY KEY,
                     program_name TEXT,
                     short_name TEXT,
@@ -37,173 +206,220 @@ def create_and_populate_all_programs_table(df, engine):
                     theme TEXT,
                     importance TEXT,
                     notes_with_applied TEXT,
-                    num_companies INT
+                    num_companies INT,
+                    row_hash TEXT
                 )
             """))
             conn.commit()
-            logging.info("Created table: all_programs.")
-
-        # Rename columns to match database schema
-        df.rename(columns={
-            'Program Name': 'program_name',
-            'Short Name': 'short_name',
-            'Org': 'org',
-            'Description': 'description',
-            'Impact': 'impact',
-            'Status': 'status',
-            'Companies': 'companies',
-            'Total Funding (m)': 'total_funding_m',
-            'Start Year': 'start_year',
-            'End Year': 'end_year',
-            'Dependency': 'dependency',
-            'Theme': 'theme',
-            'Importance': 'importance',
-            'Notes with Applied': 'notes_with_applied'
-        }, inplace=True)
-
-        # Clean DataFrame
-        df = df.dropna(how='all')  # Remove completely empty rows
-        df.columns = df.columns.str.strip()  # Strip any leading/trailing spaces from column names
-        logging.info(f"Columns available in the DataFrame: {df.columns.tolist()}")
-
-        # Validate 'id' column
-        if 'id' not in df.columns:
-            logging.error("'id' column is missing from the DataFrame.")
-            raise KeyError("'id' column is missing.")
-
-        if df['id'].isnull().any():
-            logging.error("Some rows have null IDs, which may cause issues.")
-            logging.error(f"Problematic rows:\n{df[df['id'].isnull()]}")
-            raise ValueError("Null IDs found.")
-
-        if not df['id'].apply(lambda x: str(x).isdigit()).all():
-            logging.error("Some rows have non-integer IDs.")
-            logging.error(f"Problematic rows:\n{df[~df['id'].apply(lambda x: str(x).isdigit())]}")
-            raise ValueError("Non-integer IDs found.")
-
-        df['id'] = pd.to_numeric(df['id'], errors='coerce').astype(int)
-
-        # Check for duplicate IDs
-        duplicates = df[df.duplicated(subset='id', keep=False)]
-        if not duplicates.empty:
-            logging.error(f"Duplicate IDs found: {duplicates['id'].tolist()}")
-            raise ValueError(f"Duplicate IDs detected: {duplicates['id'].tolist()}")
-
-        # Ensure 'total_funding_m' column exists
-        if 'total_funding_m' not in df.columns:
-            logging.error("'total_funding_m' column is missing from the DataFrame.")
-            raise KeyError("'total_funding_m' column is missing.")
-
-        # Clean 'total_funding_m' column
-        df['total_funding_m'] = df['total_funding_m'].replace({r'[^\d.]': ''}, regex=True)
-        df['total_funding_m'] = pd.to_numeric(df['total_funding_m'], errors='coerce')
-
-        # Convert start_year and end_year from integers to full dates
-        df['start_year'] = pd.to_datetime(df['start_year'].astype(str) + '-01-01', errors='coerce')
-        df['end_year'] = pd.to_datetime(df['end_year'].astype(str) + '-12-31', errors='coerce')
-
-
-        # we need to calculate the number of companies
-        #df['num_companies'] = df['companies'].str.split(',').apply(lambda x: len(x) if pd.notna(x) else 0)
-        df['num_companies'] = df['companies'].apply(lambda x: len(x.split(',')) if pd.notna(x) else 0)
-
-        # Log rows where 'total_funding_m' is missing or invalid
-        invalid_funding = df[df['total_funding_m'].isnull()]
-        if not invalid_funding.empty:
-            logging.warning(f"Invalid or missing 'total_funding_m' in rows: {invalid_funding[['id', 'total_funding_m']].to_dict(orient='records')}")
-
-        # Process 'Start Year' and 'End Year'
-        for date_col in ['start_year', 'end_year']:
-            if date_col in df.columns:
-                df[date_col] = pd.to_datetime(df[date_col], format='%Y', errors='coerce')
-            else:
-                logging.warning(f"'{date_col}' column is missing from the DataFrame.")
-                df[date_col] = pd.NaT
-
-        # Select only the columns that exist in the DataFrame to avoid KeyErrors
-        expected_columns = [
-            'id', 'program_name', 'short_name', 'org', 'description', 'impact', 'status',
-            'companies', 'total_funding_m', 'start_year', 'end_year', 'dependency',
-            'theme', 'importance', 'notes_with_applied', 'num_companies'
-        ]
-        existing_columns = [col for col in expected_columns if col in df.columns]
-        df = df[existing_columns]
+            logging.info(f"Created table: {all_programs}.")
+
+        df = prepare_all_programs_dataframe(df)
 
         # Insert data into all_programs table
-        df.to_sql('all_programs', engine, if_exists='append', index=False, method='multi', chunksize=1000)
+        bulk_load_dataframe(df, 'all_programs', engine, schema=schema)
         logging.info("All programs table populated successfully.")
         logging.info(f"Inserted {len(df)} rows into the all_programs table.")
 
+        return pd.Index(df['id'])
+
     except Exception as e:
         logging.error(f"An error occurred while creating or populating all_programs table: {e}")
         raise e  # Re-raise the exception for handling upstream
 
-def create_and_populate_dependency_table(df, engine):
+def diff_program_rows(df, current_df):
+    """
+    Compare the prepared sheet rows against the (id, row_hash) rows of all_programs.
+    Returns the new or changed rows and the list of ids no longer in the sheet.
+    """
+    merged = df[['id', 'row_hash']].merge(current_df, on='id', how='left', suffixes=('', '_current'))
+    changed_df = df[(merged['row_hash'] != merged['row_hash_current']).to_numpy()]
+    removed_ids = current_df.loc[~current_df['id'].isin(df['id']), 'id'].tolist()
+    return changed_df, removed_ids
+
+def upsert_all_programs(conn, df, schema=None):
+    """
+    Sync the existing 'all_programs' table with the sheet DataFrame inside the caller's transaction.
+    Only rows whose row hash changed are upserted and only programs missing from the sheet are deleted.
+    Returns the program ids now in the table as a pandas Index.
+    """
+    all_programs = qualified_name('all_programs', schema)
+    df = prepare_all_programs_dataframe(df)
+
+    # Tables created before row hashes were introduced are treated as fully changed
+    conn.execute(text(f"ALTER TABLE {all_programs} ADD COLUMN IF NOT EXISTS row_hash TEXT"))
+    current_df = pd.read_sql(f'SELECT id, row_hash FROM {all_programs}', conn)
+
+    changed_df, removed_ids = diff_program_rows(df, current_df)
+    logging.info(f"all_programs diff: {len(changed_df)} new or changed, {len(removed_ids)} removed, {len(df) - len(changed_df)} unchanged.")
+
+    if removed_ids:
+        # Remove references to deleted programs before deleting the programs themselves
+        for table_name, column in [('program_company', 'program_id'),
+                                   ('program_dependencies', 'program_id'),
+                                   ('program_dependencies', 'dependency_id')]:
+            table_name = qualified_name(table_name, schema)
+            if table_exists(conn, table_name):
+                conn.execute(text(f"DELETE FROM {table_name} WHERE {column} = ANY(:ids)"), {'ids': removed_ids})
+        conn.execute(text(f"DELETE FROM {all_programs} WHERE id = ANY(:ids)"), {'ids': removed_ids})
+        logging.info(f"Deleted {len(removed_ids)} programs from the all_programs table.")
+
+    if not changed_df.empty:
+        # Stage the changed rows and merge them in with a single INSERT ... ON CONFLICT
+        conn.execute(text(f"CREATE TEMP TABLE all_programs_changes (LIKE {all_programs}) ON COMMIT DROP"))
+        copy_dataframe(changed_df, 'all_programs_changes', conn.connection)
+
+        columns = ', '.join(changed_df.columns)
+        updates = ', '.join(f"{col} = EXCLUDED.{col}" for col in changed_df.columns if col != 'id')
+        conn.execute(text(f"""
+            INSERT INTO {all_programs} ({columns})
+            SELECT {columns} FROM all_programs_changes
+            ON CONFLICT (id) DO UPDATE SET {updates}
+        """))
+        logging.info(f"Upserted {len(changed_df)} rows into the all_programs table.")
+
+    return pd.Index(df['id'])
+
+def diff_id_pairs(desired_df, current_df):
+    """
+    Compare the (id, id) pairs a table should hold with the pairs it holds.
+    Returns the pairs to insert and the pairs to delete.
+    """
+    columns = list(desired_df.columns)
+    desired_df = desired_df.astype('int64')
+    current_df = current_df[columns].astype('int64')
+    merged = desired_df.merge(current_df, on=columns, how='outer', indicator=True)
+    missing_df = merged.loc[merged['_merge'] == 'left_only', columns].reset_index(drop=True)
+    extra_df = merged.loc[merged['_merge'] == 'right_only', columns].reset_index(drop=True)
+    return missing_df, extra_df
+
+def apply_id_pair_diff(conn, table_name, missing_df, extra_df):
+    """
+    Delete extra_df's pairs from and COPY missing_df's pairs into a table, inside the caller's transaction.
+    """
+    if not extra_df.empty:
+        first, second = extra_df.columns
+        conn.execute(text(f"""
+            DELETE FROM {table_name}
+            WHERE ({first}, {second}) IN (SELECT * FROM unnest(CAST(:first AS INT[]), CAST(:second AS INT[])))
+        """), {'first': extra_df[first].tolist(), 'second': extra_df[second].tolist()})
+    if not missing_df.empty:
+        copy_dataframe(missing_df, table_name, conn.connection)
+    logging.info(f"{table_name} diff: {len(missing_df)} inserted, {len(extra_df)} deleted.")
+
+def resolve_program_ids(engine, all_programs, program_ids=None, verify=False, conn=None):
+    """
+    Return the ids of the all_programs table as a pandas Index.
+    The in-memory ids from the all_programs stage are used when given; the table is only
+    queried when they are missing, or when verify=True to cross-check them.
+    The table is read on conn when given, e.g. inside an open transaction.
+    """
+    if program_ids is not None and not verify:
+        return pd.Index(program_ids)
+
+    if conn is None:
+        with engine.connect() as conn:
+            table_ids = pd.Index(pd.read_sql(f'SELECT id FROM {all_programs}', conn)['id'])
+    else:
+        table_ids = pd.Index(pd.read_sql(f'SELECT id FROM {all_programs}', conn)['id'])
+
+    if program_ids is not None:
+        mismatched = pd.Index(program_ids).symmetric_difference(table_ids)
+        if not mismatched.empty:
+            logging.warning(f"In-memory program IDs differ from {all_programs} for IDs: {mismatched.tolist()}")
+    return table_ids
+
+def parse_program_dependencies(df):
+    """
+    Split the comma-separated 'dependency' column into unique (program_id, dependency_id) pairs.
+    Tokens that are not integers are skipped with a warning.
+    """
+    # Filter rows with dependencies
+    dependency_df = df[df['dependency'].notna() & (df['dependency'] != '')]
+    dependency_df = dependency_df[['id', 'dependency']].drop_duplicates()
+    if dependency_df.empty:
+        return pd.DataFrame({'program_id': pd.Series(dtype='int64'), 'dependency_id': pd.Series(dtype='int64')})
+
+    tokens = dependency_df.assign(token=dependency_df['dependency'].str.split(',')).explode('token')
+    tokens['token'] = tokens['token'].str.strip()
+    tokens = tokens[tokens['token'].notna() & (tokens['token'] != '')]
+
+    # Optional sign and ASCII digits; to_numeric would turn '1.5' or '1e3' into numbers that int() rejects
+    is_integer = tokens['token'].str.fullmatch(r'[+-]?[0-9]+')
+    # Tokens with more than 18 significant digits may not fit in int64, and no program id is that large
+    fits_int64 = tokens['token'].str.lstrip('+-').str.lstrip('0').str.len() <= 18
+    dependency_ids = pd.to_numeric(tokens['token'].where(is_integer & fits_int64), errors='coerce',
+                                   dtype_backend='numpy_nullable')
+    is_valid = dependency_ids.notna().to_numpy()
+    for program_id, token in tokens.loc[~is_valid, ['id', 'token']].itertuples(index=False):
+        logging.warning(f"Invalid dependency ID: '{token}' in program ID {program_id}")
+
+    return pd.DataFrame({
+        'program_id': tokens['id'].to_numpy()[is_valid],
+        'dependency_id': dependency_ids[is_valid].astype('int64').to_numpy(),
+    }).drop_duplicates().reset_index(drop=True)
+
+def filter_dependencies(dependency_df, valid_program_ids):
+    """
+    Drop dependency pairs that reference a program id outside valid_program_ids, with a warning.
+    """
+    is_valid = dependency_df['program_id'].isin(valid_program_ids) & dependency_df['dependency_id'].isin(valid_program_ids)
+    invalid_dependencies = dependency_df[~is_valid]
+    if not invalid_dependencies.empty:
+        logging.warning(f"Foreign key violations found for dependencies: {invalid_dependencies.to_dict(orient='records')}")
+    return dependency_df[is_valid]
+
+def sync_dependency_table(conn, df, valid_program_ids, schema=None):
+    """
+    Bring the existing 'program_dependencies' table in line with the sheet inside the caller's transaction,
+    inserting and deleting only the pairs that changed.
+    """
+    program_dependencies = qualified_name('program_dependencies', schema)
+    dependency_df = filter_dependencies(parse_program_dependencies(df), valid_program_ids)
+    current_df = pd.read_sql(f'SELECT program_id, dependency_id FROM {program_dependencies}', conn)
+    missing_df, extra_df = diff_id_pairs(dependency_df, current_df)
+    apply_id_pair_diff(conn, program_dependencies, missing_df, extra_df)
+
+def create_and_populate_dependency_table(df, engine, schema=None, program_ids=None, verify_program_ids=False):
     """
     Create and populate the 'program_dependencies' table in the PostgreSQL database.
+    program_ids (as returned by create_and_populate_all_programs_table) avoids re-reading all_programs;
+    verify_program_ids=True cross-checks them against the table.
     """
+    all_programs = qualified_name('all_programs', schema)
+    program_dependencies = qualified_name('program_dependencies', schema)
     try:
         with engine.connect() as conn:
             # Drop existing table
-            conn.execute(text("DROP TABLE IF EXISTS program_dependencies CASCADE"))
-            conn.commit()
+            conn.execute(text(f"DROP TABLE IF EXISTS {program_dependencies} CASCADE"))
             logging.info("Dropped existing table: program_dependencies.")
+            conn.commit()
 
         with engine.connect() as conn:
             # Create the program_dependencies table
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS program_dependencies (
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {program_dependencies} (
                     id SERIAL PRIMARY KEY,
                     program_id INT,
                     dependency_id INT,
                     UNIQUE (program_id, dependency_id),
-                    FOREIGN KEY (program_id) REFERENCES all_programs(id),
-                    FOREIGN KEY (dependency_id) REFERENCES all_programs(id)
+                    FOREIGN KEY (program_id) REFERENCES {all_programs}(id),
+                    FOREIGN KEY (dependency_id) REFERENCES {all_programs}(id)
                 )
             """))
             conn.commit()
             logging.info("Created table: program_dependencies.")
 
-        # Filter rows with dependencies
-        dependency_df = df[df['dependency'].notna() & (df['dependency'] != '')].copy()
-        dependency_df = dependency_df[['id', 'dependency']].drop_duplicates()
-
-        # Assuming 'dependency' column contains comma-separated dependency IDs
-        dependency_rows = set()  # Using a set to store unique (program_id, dependency_id) pairs
-        for _, row in dependency_df.iterrows():
-            program_id = row['id']
-            dependencies = row['dependency']
-            for dependency_id in dependencies.split(','):
-                dependency_id = dependency_id.strip()
-                if dependency_id:
-                    try:
-                        dep_id_int = int(dependency_id)
-                        dependency_rows.add((program_id, dep_id_int))
-                    except ValueError:
-                        logging.warning(f"Invalid dependency ID: '{dependency_id}' in program ID {program_id}")
-
-        # Convert the set to a DataFrame
-        dependency_df = pd.DataFrame(list(dependency_rows), columns=['program_id', 'dependency_id'])
+        # Parse the comma-separated dependency IDs into unique (program_id, dependency_id) pairs
+        dependency_df = parse_program_dependencies(df)
 
         # Validate program IDs
-        with engine.connect() as conn:
-            valid_program_ids = pd.read_sql('SELECT id FROM all_programs', conn)['id'].tolist()
+        valid_program_ids = resolve_program_ids(engine, all_programs, program_ids, verify=verify_program_ids)
 
         # Filter out invalid program IDs
-        valid_dependency_df = dependency_df[
-            dependency_df['program_id'].isin(valid_program_ids) &
-            dependency_df['dependency_id'].isin(valid_program_ids)
-        ]
-
-        invalid_dependencies = dependency_df[
-            ~dependency_df['program_id'].isin(valid_program_ids) |
-            ~dependency_df['dependency_id'].isin(valid_program_ids)
-        ]
-        if not invalid_dependencies.empty:
-            logging.warning(f"Foreign key violations found for dependencies: {invalid_dependencies.to_dict(orient='records')}")
+        valid_dependency_df = filter_dependencies(dependency_df, valid_program_ids)
 
         if not valid_dependency_df.empty:
-            valid_dependency_df.to_sql('program_dependencies', engine, if_exists='append', index=False, method='multi', chunksize=1000)
+            bulk_load_dataframe(valid_dependency_df, 'program_dependencies', engine, schema=schema)
             logging.info("Program dependencies table populated successfully.")
         else:
             logging.warning("No valid dependencies found to populate.")
@@ -212,101 +428,137 @@ def create_and_populate_dependency_table(df, engine):
         logging.error(f"An error occurred while creating or populating program_dependencies table: {e}")
         raise e
 
-def create_and_populate_company_tables(df, engine):
+def explode_program_companies(df):
+    """
+    Split the comma-separated 'companies' column into unique (program_id, company_name) pairs.
+    """
+    if 'companies' not in df.columns:
+        return pd.DataFrame({'program_id': pd.Series(dtype='int64'), 'company_name': pd.Series(dtype='object')})
+
+    pairs = df[['id', 'companies']].dropna(subset=['companies'])
+    pairs = pairs.assign(company_name=pairs['companies'].str.split(',')).explode('company_name')
+    pairs['company_name'] = pairs['company_name'].str.strip()
+    pairs = pairs[pairs['company_name'].notna() & (pairs['company_name'] != '')]
+
+    return (pairs.rename(columns={'id': 'program_id'})[['program_id', 'company_name']]
+                 .drop_duplicates()
+                 .reset_index(drop=True))
+
+def map_program_companies(program_company_names_df, company_map_df):
+    """
+    Replace company names with company ids using the (id, name) rows of the company table.
+    """
+    company_ids = company_map_df.rename(columns={'id': 'company_id', 'name': 'company_name'})
+    mapped = program_company_names_df.merge(company_ids[['company_id', 'company_name']], on='company_name', how='inner')
+    return mapped[['program_id', 'company_id']].drop_duplicates().reset_index(drop=True)
+
+def check_program_companies(program_company_df, valid_program_ids):
+    """
+    Raise ValueError when a program-company pair references a program id outside valid_program_ids.
+    """
+    invalid_program_company_df = program_company_df[
+        ~program_company_df['program_id'].isin(valid_program_ids)
+    ]
+    if not invalid_program_company_df.empty:
+        logging.error(f"Foreign key violation: Invalid program IDs {invalid_program_company_df['program_id'].unique().tolist()}")
+        raise ValueError("Invalid program ID references.")
+    return program_company_df
+
+def sync_company_tables(conn, df, valid_program_ids, schema=None):
+    """
+    Bring the existing 'company' and 'program_company' tables in line with the sheet inside the caller's
+    transaction. New companies are added, companies no program names any more are removed, and only
+    the changed program-company pairs are written; existing companies keep their ids.
+    """
+    company = qualified_name('company', schema)
+    program_company = qualified_name('program_company', schema)
+
+    program_company_names_df = explode_program_companies(df)
+    names = program_company_names_df['company_name'].unique().tolist()
+    inserted = conn.execute(text(f"INSERT INTO {company} (name) SELECT unnest(CAST(:names AS TEXT[])) ON CONFLICT (name) DO NOTHING"),
+                            {'names': names}).rowcount
+
+    company_map_df = pd.read_sql(f'SELECT id, name FROM {company}', conn)
+    program_company_df = check_program_companies(map_program_companies(program_company_names_df, company_map_df),
+                                                 valid_program_ids)
+    current_df = pd.read_sql(f'SELECT program_id, company_id FROM {program_company}', conn)
+    missing_df, extra_df = diff_id_pairs(program_company_df, current_df)
+    apply_id_pair_diff(conn, program_company, missing_df, extra_df)
+
+    # Delete companies only after the pairs referencing them are gone
+    removed = conn.execute(text(f"DELETE FROM {company} WHERE NOT (name = ANY(CAST(:names AS TEXT[])))"),
+                           {'names': names}).rowcount
+    logging.info(f"{company} diff: {inserted} inserted, {removed} deleted.")
+
+def create_and_populate_company_tables(df, engine, schema=None, program_ids=None, verify_program_ids=False):
     """
     Create and populate the 'company' and 'program_company' tables in the PostgreSQL database.
+    program_ids (as returned by create_and_populate_all_programs_table) avoids re-reading all_programs;
+    verify_program_ids=True cross-checks them against the table.
     """
+    all_programs = qualified_name('all_programs', schema)
+    company = qualified_name('company', schema)
+    program_company = qualified_name('program_company', schema)
     try:
         with engine.connect() as conn:
             # Drop existing tables
-            conn.execute(text("DROP TABLE IF EXISTS program_company CASCADE"))
-            conn.execute(text("DROP TABLE IF EXISTS company CASCADE"))
-            conn.commit()
+            conn.execute(text(f"DROP TABLE IF EXISTS {program_company} CASCADE"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {company} CASCADE"))
             logging.info("Dropped existing tables: program_company, company.")
+            conn.commit()
 
         with engine.connect() as conn:
             # Create the company table
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS company (
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {company} (
                     id SERIAL PRIMARY KEY,
                     name TEXT UNIQUE
                 )
             """))
             # Create the program_company table
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS program_company (
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {program_company} (
                     program_id INT,
                     company_id INT,
                     PRIMARY KEY (program_id, company_id),
-                    FOREIGN KEY (program_id) REFERENCES all_programs(id),
-                    FOREIGN KEY (company_id) REFERENCES company(id)
+                    FOREIGN KEY (program_id) REFERENCES {all_programs}(id),
+                    FOREIGN KEY (company_id) REFERENCES {company}(id)
                 )
             """))
             conn.commit()
             logging.info("Created tables: company, program_company.")
 
         # Extract unique company names
-        company_names = set()
-        program_company_rows = []
-        for _, row in df.iterrows():
-            program_id = row['id']
-            companies = row.get('companies', '')
-            if pd.notna(companies):
-                for company in set(companies.split(',')):  # Split by comma without space to be safe
-                    company = company.strip()
-                    if company:  # Ensure company name is not empty
-                        company_names.add(company)
-                        program_company_rows.append({'program_id': program_id, 'company_name': company})
+        program_company_names_df = explode_program_companies(df)
 
         # Insert unique company names into the company table
-        company_df = pd.DataFrame(list(company_names), columns=['name'])
+        company_df = pd.DataFrame({'name': program_company_names_df['company_name'].unique()})
         if not company_df.empty:
-            company_df.to_sql('company', engine, if_exists='append', index=False, method='multi', chunksize=1000)
+            bulk_load_dataframe(company_df, 'company', engine, schema=schema)
             logging.info(f"Inserted {len(company_df)} unique companies into the company table.")
         else:
             logging.warning("No companies found to insert into the company table.")
 
         # Fetch company IDs
         with engine.connect() as conn:
-            company_map_df = pd.read_sql('SELECT id, name FROM company', conn)
-            company_map = dict(zip(company_map_df['name'], company_map_df['id']))
-
-        # Map program-company relationships
-        program_company_rows_mapped = [
-            {'program_id': row['program_id'], 'company_id': company_map.get(row['company_name'])}
-            for row in program_company_rows
-            if row['company_name'] in company_map
-        ]
+            company_map_df = pd.read_sql(f'SELECT id, name FROM {company}', conn)
 
-        # Remove any rows where company_id could not be mapped
-        valid_program_company_rows = [row for row in program_company_rows_mapped if row['company_id'] is not None]
+        # Map program-company relationships, dropping names that could not be mapped to an id
+        program_company_df = map_program_companies(program_company_names_df, company_map_df)
 
-        if not valid_program_company_rows:
+        if program_company_df.empty:
             logging.error("No valid program-company associations found to insert.")
             return
 
-        # Create DataFrame and remove duplicates
-        program_company_df = pd.DataFrame(valid_program_company_rows).drop_duplicates()
-
         # Validate program IDs
-        with engine.connect() as conn:
-            valid_program_ids = pd.read_sql('SELECT id FROM all_programs', conn)['id'].tolist()
+        valid_program_ids = resolve_program_ids(engine, all_programs, program_ids, verify=verify_program_ids)
 
-        # Filter out invalid program IDs
-        valid_program_company_df = program_company_df[
-            program_company_df['program_id'].isin(valid_program_ids)
-        ]
-
-        invalid_program_company_df = program_company_df[
-            ~program_company_df['program_id'].isin(valid_program_ids)
-        ]
-        if not invalid_program_company_df.empty:
-            logging.error(f"Foreign key violation: Invalid program IDs {invalid_program_company_df['program_id'].unique().tolist()}")
-            raise ValueError("Invalid program ID references.")
+        # Reject invalid program IDs
+        valid_program_company_df = check_program_companies(program_company_df, valid_program_ids)
 
         # Insert into program_company table
         if not valid_program_company_df.empty:
-            valid_program_company_df.to_sql('program_company', engine, if_exists='append', index=False, method='multi', chunksize=1000)
+            bulk_load_dataframe(valid_program_company_df, 'program_company', engine, schema=schema)
             logging.info("Program_company table populated successfully.")
             logging.info(f"Inserted {len(valid_program_company_df)} rows into the program_company table.")
         else:
@@ -314,4 +566,132 @@ def create_and_populate_company_tables(df, engine):
 
     except Exception as e:
         logging.error(f"An error occurred while populating company tables: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+# Schema owned by this tool that full rebuilds are loaded into before being swapped into place
+STAGING_SCHEMA = os.getenv('STAGING_SCHEMA', 'visual_autonomy_staging')
+
+# Tables built by the loaders in this module
+LOADED_TABLES = ['all_programs', 'company', 'program_company', 'program_dependencies']
+
+# Checksum of a table's rows that does not depend on their order, so PostgreSQL needs no sort:
+# the row count and the sum of the first 64 bits of every row's md5
+TABLE_CHECKSUM_SQL = "(SELECT count(*) || ':' || COALESCE(sum(('x' || left(md5(t::text), 16))::bit(64)::bigint), 0) FROM {table} t) AS {table}"
+
+def table_checksums(engine, tables=LOADED_TABLES):
+    """
+    Return {table: checksum of its rows}, computed by PostgreSQL in one round trip.
+    Every row of every table is read, so the cost grows linearly with the table sizes.
+    """
+    columns = ",\n".join(TABLE_CHECKSUM_SQL.format(table=table) for table in tables)
+    with engine.connect() as conn:
+        row = conn.execute(text(f"SELECT {columns}")).one()
+    return dict(zip(tables, row))
+
+# Tables, views, standalone sequences and functions in a schema, other than the given tables.
+# Sequences and indexes that belong to a table are dropped with it and are not listed.
+FOREIGN_OBJECTS_QUERY = """
+    SELECT c.relname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = :schema
+      AND c.relkind IN ('r', 'p', 'v', 'm', 'f', 'S')
+      AND c.relname <> ALL(:tables)
+      AND NOT EXISTS (
+          SELECT 1 FROM pg_depend d
+          WHERE d.classid = 'pg_class'::regclass AND d.objid = c.oid AND d.deptype IN ('a', 'i')
+      )
+    UNION ALL
+    SELECT p.proname
+    FROM pg_proc p
+    JOIN pg_namespace n ON n.oid = p.pronamespace
+    WHERE n.nspname = :schema
+"""
+
+def reset_staging_schema(engine, schema=STAGING_SCHEMA):
+    """
+    Recreate the staging schema empty. Raises RuntimeError instead of dropping a schema of that name
+    that holds anything besides leftover LOADED_TABLES, so a schema of another application is never destroyed.
+    """
+    with engine.connect() as conn:
+        foreign_objects = conn.execute(text(FOREIGN_OBJECTS_QUERY), {'schema': schema, 'tables': LOADED_TABLES}).scalars().all()
+        if foreign_objects:
+            logging.error(f"Staging schema {schema} holds objects this tool did not create: {foreign_objects}")
+            raise RuntimeError(f"Refusing to drop schema {schema}; set STAGING_SCHEMA to a schema owned by this tool.")
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.commit()
+        logging.info(f"Created staging schema: {schema}.")
+
+def rebuild_tables_via_staging(df, engine, on_swap=None, verify_program_ids=False):
+    """
+    Rebuild all tables in the staging schema, then swap them into the public schema in a single transaction.
+    on_swap(conn) is called inside the swap transaction, e.g. to recreate views on the new tables.
+    """
+    reset_staging_schema(engine)
+
+    program_ids = create_and_populate_all_programs_table(df, engine, schema=STAGING_SCHEMA)
+
+    # The company and dependency tables only depend on all_programs, so build them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(create_and_populate_company_tables, df, engine, schema=STAGING_SCHEMA,
+                            program_ids=program_ids, verify_program_ids=verify_program_ids),
+            executor.submit(create_and_populate_dependency_table, df, engine, schema=STAGING_SCHEMA,
+                            program_ids=program_ids, verify_program_ids=verify_program_ids),
+        ]
+        for future in futures:
+            future.result()
+
+    swap_staging_tables(engine, on_swap=on_swap)
+
+def swap_staging_tables(engine, on_swap=None):
+    """
+    Replace the public tables with the staging tables in one transaction, so readers never see missing or partial tables.
+    """
+    start = time.perf_counter()
+    try:
+        with engine.begin() as conn:
+            for table_name in LOADED_TABLES:
+                conn.execute(text(f"DROP TABLE IF EXISTS public.{table_name} CASCADE"))
+            # Indexes, constraints and SERIAL sequences move along with each table
+            for table_name in LOADED_TABLES:
+                conn.execute(text(f"ALTER TABLE {STAGING_SCHEMA}.{table_name} SET SCHEMA public"))
+            if on_swap is not None:
+                on_swap(conn)
+            conn.execute(text(f"DROP SCHEMA {STAGING_SCHEMA}"))
+    except Exception as e:
+        logging.error(f"An error occurred while swapping staging tables into place: {e}")
+        raise e
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logging.info(f"Swapped staging tables into the public schema in {elapsed_ms:.0f} ms: {', '.join(LOADED_TABLES)}.")
+
+def update_tables_incrementally(df, engine, on_update=None, verify_program_ids=False):
+    """
+    Bring the existing tables in line with the sheet by writing only the rows that changed, all in one
+    transaction, so readers see either the old or the new data. on_update(conn) is called inside that
+    transaction, e.g. to recreate views. Falls back to a full rebuild when any table is missing.
+    """
+    with engine.connect() as conn:
+        missing_tables = [table_name for table_name in LOADED_TABLES if not table_exists(conn, table_name)]
+    if missing_tables:
+        logging.info(f"Tables {', '.join(missing_tables)} do not exist yet; falling back to a full rebuild.")
+        rebuild_tables_via_staging(df, engine, on_swap=on_update, verify_program_ids=verify_program_ids)
+        return
+
+    start = time.perf_counter()
+    try:
+        with engine.begin() as conn:
+            program_ids = upsert_all_programs(conn, df)
+            program_ids = resolve_program_ids(engine, 'all_programs', program_ids, verify=verify_program_ids, conn=conn)
+            sync_company_tables(conn, df, program_ids)
+            sync_dependency_table(conn, df, program_ids)
+            if on_update is not None:
+                on_update(conn)
+    except Exception as e:
+        logging.error(f"An error occurred while updating the tables incrementally: {e}")
+        raise e
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logging.info(f"Updated the tables incrementally in {elapsed_ms:.0f} ms: {', '.join(LOADED_TABLES)}.")
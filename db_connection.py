@@ -1,17 +1,24 @@
 # db_connection.py
 
 import os
+import threading
+import contextlib
 from sqlalchemy import create_engine
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-def get_postgres_engine():
+# Engines created by get_postgres_engine, keyed by URL and pool settings
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_postgres_engine(pool_size=None, max_overflow=None, statement_timeout_ms=None, application_name=None):
     """
-    Creates and returns a connection engine to PostgreSQL.
+    Returns the shared connection engine to PostgreSQL, creating it on first use.
+    Engines are cached per settings, so every pipeline stage in a process shares one warmed pool.
+    Settings that are not passed come from DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW,
+    DATABASE_STATEMENT_TIMEOUT_MS and DATABASE_APPLICATION_NAME.
     """
     POSTGRES_USER = os.getenv('DATABASE_USER')
     POSTGRES_PASSWORD = os.getenv('DATABASE_PASSWORD')
@@ -20,16 +27,86 @@ def get_postgres_engine():
     POSTGRES_PORT = os.getenv('LOCAL_DATABASE_PORT')
 
     DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-    
-    engine = create_engine(DATABASE_URL)
+
+    if pool_size is None:
+        pool_size = int(os.getenv('DATABASE_POOL_SIZE', 5))
+    if max_overflow is None:
+        max_overflow = int(os.getenv('DATABASE_MAX_OVERFLOW', 10))
+    if statement_timeout_ms is None:
+        statement_timeout_ms = int(os.getenv('DATABASE_STATEMENT_TIMEOUT_MS', 0))
+    if application_name is None:
+        application_name = os.getenv('DATABASE_APPLICATION_NAME', 'visual_autonomy')
+
+    key = (DATABASE_URL, pool_size, max_overflow, statement_timeout_ms, application_name)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            connect_args = {'application_name': application_name}
+            if statement_timeout_ms:
+                connect_args['options'] = f"-c statement_timeout={statement_timeout_ms}"
+            engine = create_engine(
+                DATABASE_URL,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_pre_ping=True,  # Replace connections dropped by the server instead of failing a stage
+                connect_args=connect_args,
+            )
+            _engines[key] = engine
     return engine
 
-def get_google_sheet_service():
+def dispose_postgres_engines():
     """
-    Creates and returns the Google Sheets API service.
+    Closes the pooled connections of every cached engine and forgets the engines.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+# Nesting depth of postgres_engine_scope blocks; only the outermost one disposes the engines
+_scope_depth = 0
+
+@contextlib.contextmanager
+def postgres_engine_scope():
+    """
+    Disposes every cached engine when the outermost scope exits. Each entry point's main() runs inside
+    one, so a script closes its connections on exit while the stages pipeline.py calls in-process
+    keep sharing the pipeline's pool.
+    """
+    global _scope_depth
+    with _engines_lock:
+        _scope_depth += 1
+    try:
+        yield
+    finally:
+        with _engines_lock:
+            _scope_depth -= 1
+            outermost = _scope_depth == 0
+        if outermost:
+            dispose_postgres_engines()
+
+def _build_google_service(api_name, api_version):
     """
+    Builds a Google API service from the service account credentials.
+    """
+    # Imported here so scripts that only use PostgreSQL do not pay for loading the Google client libraries
+    from google.oauth2.service_account import Credentials
+    from googleapiclient.discovery import build
+
     SERVICE_ACCOUNT_FILE = os.getenv('SERVICE_ACCOUNT_FILE')
-    
+
     creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE)
-    service = build('sheets', 'v4', credentials=creds)
-    return service
+    # Use the discovery document bundled with the client library instead of fetching it over the network
+    return build(api_name, api_version, credentials=creds, static_discovery=True, cache_discovery=False)
+
+def get_google_sheet_service():
+    """
+    Creates and returns the Google Sheets API service.
+    """
+    return _build_google_service('sheets', 'v4')
+
+def get_google_drive_service():
+    """
+    Creates and returns the Google Drive API service, used to read spreadsheet revisions.
+    """
+    return _build_google_service('drive', 'v3')
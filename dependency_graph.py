@@ -0,0 +1,251 @@
+# dependency_graph.py
+# loads program_dependencies once into compressed sparse row (CSR) arrays and answers
+# orphan, source, sink, degree and reachability questions in memory.
+
+import logging
+import numpy as np
+import pandas as pd
+from db_connection import get_postgres_engine
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PROGRAM_IDS_QUERY = "SELECT id FROM all_programs"
+EDGES_QUERY = "SELECT program_id, dependency_id FROM program_dependencies"
+
+# Traversal directions: a program's dependencies (outbound edges) or its dependents (inbound edges)
+DEPENDENCIES = 'dependencies'
+DEPENDENTS = 'dependents'
+
+def build_csr(sources, targets, num_nodes):
+    """
+    Return (offsets, neighbors) so the neighbors of node i are neighbors[offsets[i]:offsets[i + 1]].
+    """
+    order = np.argsort(sources, kind='stable')
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_nodes), out=offsets[1:])
+    return offsets, targets[order]
+
+def gather_neighbors(offsets, neighbors, nodes):
+    """
+    Return the concatenated neighbor lists of the given node indices, without a Python-level loop.
+    """
+    starts = offsets[nodes]
+    counts = offsets[nodes + 1] - starts
+    # Position of every gathered element inside its node's neighbor list
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return neighbors[np.repeat(starts, counts) + within]
+
+class DependencyGraph:
+    """
+    Directed program dependency graph: an edge program_id -> dependency_id means the program depends on
+    the dependency. Nodes are stored as dense indices into the sorted program ids, with CSR arrays for
+    both outbound (dependencies) and inbound (dependents) edges.
+    """
+    def __init__(self, program_ids, program_id, dependency_id):
+        self.ids = np.unique(np.asarray(program_ids, dtype=np.int64))
+        self.index = pd.Index(self.ids, name='id')
+        program_id = np.asarray(program_id, dtype=np.int64)
+        dependency_id = np.asarray(dependency_id, dtype=np.int64)
+
+        # Edges that reference a program that does not exist are dropped, as the foreign keys would
+        sources, source_known = self._lookup(program_id)
+        targets, target_known = self._lookup(dependency_id)
+        known = source_known & target_known
+        if not known.all():
+            logging.warning(f"Ignoring {int((~known).sum())} dependency edges that reference unknown program ids")
+        sources, targets = sources[known], targets[known]
+
+        # Duplicate edges would inflate the degrees; pack each edge into one int64 key to deduplicate
+        edge_keys = np.unique(sources.astype(np.int64) * len(self.ids) + targets)
+        self.edge_sources, self.edge_targets = np.divmod(edge_keys, max(len(self.ids), 1))
+
+        self.out_offsets, self.out_neighbors = build_csr(self.edge_sources, self.edge_targets, len(self.ids))
+        self.in_offsets, self.in_neighbors = build_csr(self.edge_targets, self.edge_sources, len(self.ids))
+
+    @property
+    def num_programs(self):
+        return len(self.ids)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_sources)
+
+    def _lookup(self, program_ids):
+        """
+        Return the node indices of program ids and a mask of which ids are in the graph.
+        """
+        # A hash lookup is much faster than a binary search for large batches of unsorted ids
+        indices = self.index.get_indexer(program_ids)
+        return indices, indices >= 0
+
+    def index_of(self, program_ids):
+        """
+        Map program ids to node indices, raising KeyError for ids that are not in the graph.
+        """
+        program_ids = np.atleast_1d(np.asarray(program_ids, dtype=np.int64))
+        indices, found = self._lookup(program_ids)
+        if not found.all():
+            raise KeyError(f"Unknown program ids: {program_ids[~found].tolist()}")
+        return indices
+
+    def _csr(self, direction):
+        if direction == DEPENDENCIES:
+            return self.out_offsets, self.out_neighbors
+        if direction == DEPENDENTS:
+            return self.in_offsets, self.in_neighbors
+        raise ValueError(f"Unknown direction: {direction}")
+
+    def _out_degree(self):
+        return np.diff(self.out_offsets)
+
+    def _in_degree(self):
+        return np.diff(self.in_offsets)
+
+    def out_degree(self):
+        """
+        Number of dependencies of every program, indexed by program id.
+        """
+        return pd.Series(self._out_degree(), index=self.index, name='out_degree')
+
+    def in_degree(self):
+        """
+        Number of dependents of every program, indexed by program id.
+        """
+        return pd.Series(self._in_degree(), index=self.index, name='in_degree')
+
+    def orphans(self):
+        """
+        Programs with neither dependencies nor dependents.
+        """
+        return self.ids[(self._out_degree() == 0) & (self._in_degree() == 0)]
+
+    def sources(self):
+        """
+        Programs that nothing depends on but that have dependencies themselves (the top of the graph).
+        """
+        return self.ids[(self._in_degree() == 0) & (self._out_degree() > 0)]
+
+    def sinks(self):
+        """
+        Programs that others depend on but that have no dependencies themselves (the foundations).
+        """
+        return self.ids[(self._out_degree() == 0) & (self._in_degree() > 0)]
+
+    def dependencies(self, program_id):
+        """
+        Direct dependencies of a program.
+        """
+        return self.ids[gather_neighbors(self.out_offsets, self.out_neighbors, self.index_of(program_id))]
+
+    def dependents(self, program_id):
+        """
+        Programs that depend directly on a program.
+        """
+        return self.ids[gather_neighbors(self.in_offsets, self.in_neighbors, self.index_of(program_id))]
+
+    def _reachable_mask(self, start, direction):
+        offsets, neighbors = self._csr(direction)
+        visited = np.zeros(len(self.ids), dtype=bool)
+        # Breadth-first search, expanding the whole frontier at once
+        frontier = start
+        while len(frontier):
+            frontier = gather_neighbors(offsets, neighbors, frontier)
+            frontier = np.unique(frontier[~visited[frontier]])
+            visited[frontier] = True
+        return visited
+
+    def reachable(self, program_ids, direction=DEPENDENCIES):
+        """
+        Programs reachable in one or more steps from any of program_ids: all transitive dependencies,
+        or all transitive dependents with direction='dependents'. A start program is only included
+        when it lies on a cycle.
+        """
+        return self.ids[self._reachable_mask(self.index_of(program_ids), direction)]
+
+    def is_reachable(self, from_id, to_id, direction=DEPENDENCIES):
+        """
+        Whether to_id is reachable from from_id, i.e. whether from_id depends on to_id, directly or not.
+        """
+        target = self.index_of(to_id)[0]
+        return bool(self._reachable_mask(self.index_of(from_id), direction)[target])
+
+    def strongly_connected_components(self):
+        """
+        Label every node with its strongly connected component using an iterative Tarjan's algorithm.
+        Returns (labels, count). Components are numbered in the order Tarjan completes them, so a
+        component's dependencies always have lower labels than the component itself.
+        """
+        num_nodes = len(self.ids)
+        # Plain lists are much faster than numpy arrays for element-by-element access
+        offsets = self.out_offsets.tolist()
+        neighbors = self.out_neighbors.tolist()
+        index = [-1] * num_nodes
+        low = [0] * num_nodes
+        on_stack = [False] * num_nodes
+        labels = [-1] * num_nodes
+        stack = []
+        counter = 0
+        count = 0
+
+        for root in range(num_nodes):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            # Each work item is a node and the position of the next outbound edge to follow
+            work = [(root, offsets[root])]
+            while work:
+                node, position = work[-1]
+                end = offsets[node + 1]
+                while position < end:
+                    neighbor = neighbors[position]
+                    position += 1
+                    if index[neighbor] == -1:
+                        work[-1] = (node, position)
+                        index[neighbor] = low[neighbor] = counter
+                        counter += 1
+                        stack.append(neighbor)
+                        on_stack[neighbor] = True
+                        work.append((neighbor, offsets[neighbor]))
+                        break
+                    if on_stack[neighbor] and index[neighbor] < low[node]:
+                        low[node] = index[neighbor]
+                else:
+                    # Every edge of node has been followed
+                    work.pop()
+                    if low[node] == index[node]:
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = False
+                            labels[member] = count
+                            if member == node:
+                                break
+                        count += 1
+                    if work:
+                        parent = work[-1][0]
+                        if low[node] < low[parent]:
+                            low[parent] = low[node]
+
+        return np.array(labels, dtype=np.int64), count
+
+def load_dependency_graph(engine=None, program_ids=None):
+    """
+    Build the dependency graph from a single bulk read of program_dependencies. The program ids are
+    read from all_programs unless given, so programs without any edges are part of the graph.
+    """
+    engine = engine or get_postgres_engine()
+    try:
+        with engine.connect() as conn:
+            if program_ids is None:
+                program_ids = pd.read_sql(PROGRAM_IDS_QUERY, conn)['id']
+            edges = pd.read_sql(EDGES_QUERY, conn)
+    except Exception as e:
+        logging.error(f"Error loading the dependency graph: {e}")
+        raise e
+
+    graph = DependencyGraph(program_ids, edges['program_id'], edges['dependency_id'])
+    logging.info(f"Loaded dependency graph with {graph.num_programs} programs and {graph.num_edges} edges.")
+    return graph
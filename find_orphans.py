@@ -1,39 +1,27 @@
-# run_query.py
-# this code just runs a sql query to find orphaned programs in the database.
+# find_orphans.py
+# finds orphaned programs (no dependencies and no dependents) using the in-memory dependency graph.
 
-from db_connection import get_postgres_engine
+from db_connection import get_postgres_engine, postgres_engine_scope
+from dependency_graph import load_dependency_graph
 import pandas as pd
 
-def run_query():
-    # Get the PostgreSQL engine
-    engine = get_postgres_engine()
-
-    # Define the SQL query
-    query = """
-    WITH no_outbound AS (
-        SELECT ap.id
-        FROM all_programs ap
-        LEFT JOIN program_dependencies pd ON ap.id = pd.program_id
-        WHERE pd.program_id IS NULL
-    ),
-    no_inbound AS (
-        SELECT ap.id
-        FROM all_programs ap
-        LEFT JOIN program_dependencies pd ON ap.id = pd.dependency_id
-        WHERE pd.dependency_id IS NULL
-    )
-    SELECT ap.*
-    FROM all_programs ap
-    WHERE ap.id IN (SELECT id FROM no_outbound)
-    AND ap.id IN (SELECT id FROM no_inbound);
+def find_orphans(engine=None):
+    """
+    Return the all_programs rows of programs that neither depend on nor are depended on by any program.
     """
+    engine = engine or get_postgres_engine()
 
-    # Execute the query and fetch the result into a DataFrame
+    # Read the programs once; their ids double as the graph's node set
     with engine.connect() as connection:
-        result = pd.read_sql(query, connection)
-    
+        programs = pd.read_sql("SELECT * FROM all_programs", connection)
+
+    graph = load_dependency_graph(engine, program_ids=programs['id'])
+    return programs[programs['id'].isin(graph.orphans())].reset_index(drop=True)
+
+def run_query():
     # Display the result
-    print(result)
+    with postgres_engine_scope():
+        print(find_orphans())
 
 if __name__ == "__main__":
     run_query()
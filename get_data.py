@@ -3,36 +3,124 @@
 # license: public domain
 
 import os
+import sys
+import json
+import hashlib
+import argparse
 import pandas as pd
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
 from dotenv import load_dotenv
-from db_connection import get_postgres_engine, get_google_sheet_service
+from db_connection import get_postgres_engine, postgres_engine_scope, get_google_sheet_service, get_google_drive_service
 import logging
 from sqlalchemy import text
-from data_formatter import (
-    create_and_populate_all_programs_table,
-    create_and_populate_company_tables,
-    create_and_populate_dependency_table,  # Import the new function
-)
+from data_formatter import rebuild_tables_via_staging, update_tables_incrementally
+from atomic_files import write_json
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_data_from_google_sheet():  
+# Directory holding cached Google Sheets downloads
+SHEET_CACHE_DIR = os.getenv('SHEET_CACHE_DIR', os.path.join('.cache', 'sheets'))
+
+def sheet_cache_path(spreadsheet_id, sheet_range, cache_dir=SHEET_CACHE_DIR):
+    """
+    Return the cache file used for a spreadsheet id and range.
+    """
+    key = hashlib.sha256(f"{spreadsheet_id}:{sheet_range}".encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key}.json")
+
+def sheet_loaded_path(spreadsheet_id, sheet_range, cache_dir=SHEET_CACHE_DIR):
+    """
+    Return the file recording the content hash last loaded into PostgreSQL for a spreadsheet id and range.
+    """
+    return sheet_cache_path(spreadsheet_id, sheet_range, cache_dir)[:-len('.json')] + '.loaded.json'
+
+def get_loaded_hash(spreadsheet_id, sheet_range, cache_dir=SHEET_CACHE_DIR):
+    """
+    Return the content hash of the sheet the PostgreSQL tables were last successfully built from, or None.
+    """
+    path = sheet_loaded_path(spreadsheet_id, sheet_range, cache_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get('content_hash')
+
+def mark_sheet_loaded(spreadsheet_id, sheet_range, content_hash, cache_dir=SHEET_CACHE_DIR):
+    """
+    Record that the tables now hold the sheet with content_hash. Only call once the load has committed.
+    """
+    write_json(sheet_loaded_path(spreadsheet_id, sheet_range, cache_dir), {'content_hash': content_hash})
+
+def get_sheet_revision(drive_service, spreadsheet_id):
+    """
+    Return the Drive revision marker of the spreadsheet (its version, or modifiedTime as a fallback).
+    """
+    metadata = drive_service.files().get(fileId=spreadsheet_id, fields='version,modifiedTime').execute()
+    return metadata.get('version') or metadata.get('modifiedTime')
+
+def fetch_sheet_values(spreadsheet_id, sheet_range, sheets_service=None, drive_service=None,
+                       force=False, cache_dir=SHEET_CACHE_DIR):
+    """
+    Return (values, content_hash) for a sheet range, using an on-disk cache.
+    The download is skipped when the Drive revision matches the cached one; force=True always downloads.
+    This only caches the download: whether the tables hold that content is tracked by mark_sheet_loaded.
+    The services default to the real Google clients but can be replaced by local stand-ins.
+    """
+    cache_path = sheet_cache_path(spreadsheet_id, sheet_range, cache_dir)
+    cached = None
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cached = json.load(f)
+
+    revision = None
+    try:
+        revision = get_sheet_revision(drive_service or get_google_drive_service(), spreadsheet_id)
+    except Exception as e:
+        logging.warning(f"Could not read the spreadsheet revision, downloading it instead: {e}")
+
+    if not force and cached is not None and revision is not None and cached.get('revision') == revision:
+        logging.info(f"Google Sheet unchanged since revision {revision}; using cached values.")
+        return cached['values'], cached['content_hash']
+
+    sheets_service = sheets_service or get_google_sheet_service()
+    result = sheets_service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=sheet_range).execute()
+    values = result.get('values', [])
+
+    content_hash = hashlib.sha256(json.dumps(values, separators=(',', ':')).encode('utf-8')).hexdigest()
+    write_json(cache_path, {
+        'spreadsheet_id': spreadsheet_id,
+        'range': sheet_range,
+        'revision': revision,
+        'content_hash': content_hash,
+        'values': values,
+    })
+
+    return values, content_hash
+
+def get_sheet_fingerprint(sheets_service=None, drive_service=None, cache_dir=SHEET_CACHE_DIR):
+    """
+    Return the content hash of the program sheet, downloading it only when its Drive revision changed.
+    Reading the fingerprint does not count as loading the sheet: a later main() still rebuilds the
+    tables unless they were already built from this content.
+    """
+    _, content_hash = fetch_sheet_values(os.getenv('SPREADSHEET_ID'), os.getenv('SHEET_NAME'),
+                                         sheets_service=sheets_service, drive_service=drive_service, cache_dir=cache_dir)
+    return content_hash
+
+def load_data_from_google_sheet(force=False, sheets_service=None, drive_service=None, cache_dir=SHEET_CACHE_DIR):
+    """
+    Load the program sheet into a DataFrame.
+    Returns (df, content_hash), or (None, None) when the sheet could not be loaded.
+    """
     try:
-        # creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE)
-        # service = build('sheets', 'v4', credentials=creds)
-        service = get_google_sheet_service()
         SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
         SHEET_NAME = os.getenv('SHEET_NAME')
 
-        result = service.spreadsheets().values().get(spreadsheetId=SPREADSHEET_ID, range=SHEET_NAME).execute()
-        values = result.get('values', [])
+        values, content_hash = fetch_sheet_values(SPREADSHEET_ID, SHEET_NAME, sheets_service=sheets_service,
+                                                  drive_service=drive_service, force=force, cache_dir=cache_dir)
         
         if not values:
             logging.error("No data found in the Google Sheet.")
-            return None
+            return None, None
         
         expected_num_columns = len(values[0])
         cleaned_values = []
@@ -52,58 +140,16 @@ def load_data_from_google_sheet():
         # Ensure the 'id' column is of integer type
         df['id'] = df['id'].astype(int)
         
-        return df
+        return df, content_hash
 
     except Exception as e:
         logging.error(f"An error occurred while loading data from Google Sheets: {e}")
-        return None
+        return None, None
 
 def create_views(engine):
     try:
         with engine.connect() as conn:
-            # Create the 'program_company_yearly_value' view
-            conn.execute(text("""
-                CREATE OR REPLACE VIEW program_company_yearly_value AS
-                SELECT
-                    pc.company_id,
-                    ap.id AS program_id,
-                    make_date(gs.year, 1, 1) AS year,
-                    (ap.total_funding_m / NULLIF(ap.num_companies, 0)) / 
-                    (EXTRACT(YEAR FROM ap.end_year) - EXTRACT(YEAR FROM ap.start_year) + 1) AS yearly_value
-                FROM
-                    all_programs ap
-                JOIN
-                    program_company pc ON ap.id = pc.program_id
-                JOIN
-                    company c ON pc.company_id = c.id
-                JOIN
-                    GENERATE_SERIES(
-                        EXTRACT(YEAR FROM ap.start_year)::INT,
-                        EXTRACT(YEAR FROM ap.end_year)::INT
-                    ) AS gs(year) 
-                ON gs.year IS NOT NULL
-                WHERE
-                    ap.total_funding_m IS NOT NULL AND 
-                    ap.num_companies IS NOT NULL AND 
-                    ap.num_companies > 0 AND 
-                    ap.start_year IS NOT NULL AND 
-                    ap.end_year IS NOT NULL;
-            """))
-            logging.info("View 'program_company_yearly_value' created successfully.")
-            
-            # Create the 'program_company_value' view
-            conn.execute(text("""
-                CREATE OR REPLACE VIEW program_company_value AS
-                SELECT
-                    ap.id AS program_id,
-                    pc.company_id,
-                    ap.total_funding_m / ap.num_companies AS program_value
-                FROM
-                    all_programs ap
-                JOIN
-                    program_company pc ON ap.id = pc.program_id;
-            """))
-            logging.info("View 'program_company_value' created successfully.")
+            define_views(conn)
             
             # Commit the transaction and close the connection
             conn.commit()
@@ -112,25 +158,96 @@ def create_views(engine):
         logging.error(f"An error occurred while creating views: {e}")
         raise e
 
-if __name__ == "__main__":
+def define_views(conn):
+    """
+    Create or replace the reporting views on the given connection, inside the caller's transaction.
+    """
+    # Create the 'program_company_yearly_value' view
+    conn.execute(text("""
+        CREATE OR REPLACE VIEW program_company_yearly_value AS
+        SELECT
+            pc.company_id,
+            ap.id AS program_id,
+            make_date(gs.year, 1, 1) AS year,
+            (ap.total_funding_m / NULLIF(ap.num_companies, 0)) / 
+            (EXTRACT(YEAR FROM ap.end_year) - EXTRACT(YEAR FROM ap.start_year) + 1) AS yearly_value
+        FROM
+            all_programs ap
+        JOIN
+            program_company pc ON ap.id = pc.program_id
+        JOIN
+            company c ON pc.company_id = c.id
+        JOIN
+            GENERATE_SERIES(
+                EXTRACT(YEAR FROM ap.start_year)::INT,
+                EXTRACT(YEAR FROM ap.end_year)::INT
+            ) AS gs(year) 
+        ON gs.year IS NOT NULL
+        WHERE
+            ap.total_funding_m IS NOT NULL AND 
+            ap.num_companies IS NOT NULL AND 
+            ap.num_companies > 0 AND 
+            ap.start_year IS NOT NULL AND 
+            ap.end_year IS NOT NULL;
+    """))
+    logging.info("View 'program_company_yearly_value' created successfully.")
+    
+    # Create the 'program_company_value' view
+    conn.execute(text("""
+        CREATE OR REPLACE VIEW program_company_value AS
+        SELECT
+            ap.id AS program_id,
+            pc.company_id,
+            ap.total_funding_m / ap.num_companies AS program_value
+        FROM
+            all_programs ap
+        JOIN
+            program_company pc ON ap.id = pc.program_id;
+    """))
+    logging.info("View 'program_company_value' created successfully.")
+
+def main(argv=None):
+    """
+    Load the program sheet and rebuild (or incrementally update) the PostgreSQL tables and views.
+    """
+    parser = argparse.ArgumentParser(description="Load program data from Google Sheets into PostgreSQL.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Write only the changed rows of every table, in one transaction, instead of rebuilding them.")
+    parser.add_argument('--force', action='store_true',
+                        help="Download the sheet and rebuild the tables even if the sheet is unchanged.")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Rebuild the tables even if they were already built from this sheet content, without downloading it again.")
+    parser.add_argument('--verify-ids', action='store_true',
+                        help="Cross-check the in-memory program IDs against all_programs before loading dependent tables.")
+    args = parser.parse_args(argv)
+
     logging.info("Loading data from Google Sheets...")
-    data_df = load_data_from_google_sheet()
+    data_df, content_hash = load_data_from_google_sheet(force=args.force)
     if data_df is None:
         logging.error("Failed to load data from Google Sheets. Exiting.")
-        exit(1)
-    
-    engine = get_postgres_engine()
-    
-    logging.info("Creating and populating all_programs table...")
-    create_and_populate_all_programs_table(data_df, engine)
-    
-    logging.info("Creating and populating company tables...")
-    create_and_populate_company_tables(data_df, engine)
+        sys.exit(1)
+
+    spreadsheet_id, sheet_name = os.getenv('SPREADSHEET_ID'), os.getenv('SHEET_NAME')
+    if not (args.force or args.rebuild) and get_loaded_hash(spreadsheet_id, sheet_name) == content_hash:
+        logging.info("The tables already hold this sheet content; skipping the database rebuild (use --rebuild to rebuild anyway).")
+        return
     
-    logging.info("Creating and populating program_dependencies table...")
-    create_and_populate_dependency_table(data_df, engine)
+    with postgres_engine_scope():
+        engine = get_postgres_engine()
 
-    logging.info("Creating views...")
-    create_views(engine)
+        if args.incremental:
+            # Write only the changed rows of every table, together with the views, in one transaction
+            logging.info("Updating tables incrementally...")
+            update_tables_incrementally(data_df, engine, on_update=define_views, verify_program_ids=args.verify_ids)
+        else:
+            # Build everything in the staging schema and swap it in atomically, together with the views
+            logging.info("Rebuilding tables in the staging schema...")
+            rebuild_tables_via_staging(data_df, engine, on_swap=define_views, verify_program_ids=args.verify_ids)
+
+    # Only a committed load counts, so a failed rebuild is retried on the next run
+    mark_sheet_loaded(spreadsheet_id, sheet_name, content_hash)
     
     logging.info("Process completed successfully.")
+
+if __name__ == "__main__":
+    main()
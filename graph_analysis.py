@@ -0,0 +1,240 @@
+# graph_analysis.py
+# analyzes the program dependency graph: strongly connected components, cycles, topological depth
+# and the funding-weighted critical path. Results are cached on disk, keyed by a hash of the tables.
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from db_connection import get_postgres_engine, postgres_engine_scope
+from data_formatter import table_checksums
+from atomic_files import write_json
+from dependency_graph import load_dependency_graph, build_csr, gather_neighbors
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Directory holding cached analysis results
+ANALYSIS_CACHE_DIR = os.getenv('ANALYSIS_CACHE_DIR', os.path.join('.cache', 'graph_analysis'))
+
+# Bump when the analysis or its output format changes, so older cache entries are ignored
+ANALYSIS_VERSION = 1
+
+PROGRAMS_QUERY = "SELECT id, short_name, total_funding_m FROM all_programs"
+
+def get_table_fingerprint(engine):
+    """
+    Return a short key identifying the current contents of program_dependencies and all_programs.
+    """
+    checksums = table_checksums(engine, ['program_dependencies', 'all_programs'])
+    key = f"{ANALYSIS_VERSION}:{checksums['program_dependencies']}:{checksums['all_programs']}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+def condense(graph, labels, count):
+    """
+    Return the edges between distinct components as CSR arrays in both directions.
+    """
+    sources = labels[graph.edge_sources]
+    targets = labels[graph.edge_targets]
+    between = sources != targets
+    edge_keys = np.unique(sources[between] * count + targets[between])
+    sources, targets = np.divmod(edge_keys, max(count, 1))
+    return build_csr(sources, targets, count), build_csr(targets, sources, count)
+
+def topological_levels(condensed, count, weights):
+    """
+    Peel the condensed graph from the programs without dependencies upwards, one level at a time.
+    Returns the depth of every component (0 for no dependencies, otherwise one more than its deepest
+    dependency), the largest funding sum along any dependency chain starting at the component, and
+    the next component on that chain (-1 at the end). Linear in the size of the graph.
+    """
+    (out_offsets, _), (in_offsets, in_neighbors) = condensed
+    remaining = np.diff(out_offsets)
+    depth = np.zeros(count, dtype=np.int64)
+    best = np.zeros(count)
+    best_dependency = np.full(count, -np.inf)
+    next_component = np.full(count, -1, dtype=np.int64)
+
+    level = 0
+    frontier = np.flatnonzero(remaining == 0)
+    while len(frontier):
+        depth[frontier] = level
+        best[frontier] = weights[frontier] + np.where(np.isfinite(best_dependency[frontier]), best_dependency[frontier], 0)
+
+        # Offer every finished component to the components that depend on it
+        dependents = gather_neighbors(in_offsets, in_neighbors, frontier)
+        finished = np.repeat(frontier, in_offsets[frontier + 1] - in_offsets[frontier])
+        if len(dependents):
+            order = np.lexsort((best[finished], dependents))
+            dependents, finished = dependents[order], finished[order]
+            # The last entry per dependent carries its best finished dependency
+            last = np.r_[dependents[1:] != dependents[:-1], True]
+            candidates, chosen = dependents[last], finished[last]
+            improves = best[chosen] > best_dependency[candidates]
+            best_dependency[candidates[improves]] = best[chosen[improves]]
+            next_component[candidates[improves]] = chosen[improves]
+
+        remaining -= np.bincount(dependents, minlength=count)
+        frontier = np.unique(dependents[remaining[dependents] == 0])
+        level += 1
+
+    return depth, best, next_component
+
+def example_cycle(graph, labels, start):
+    """
+    Return one cycle through node start, as node indices, searching only inside its component.
+    """
+    component = labels[start]
+    parents = {start: None}
+    queue = [start]
+    for node in queue:
+        for neighbor in graph.out_neighbors[graph.out_offsets[node]:graph.out_offsets[node + 1]].tolist():
+            if neighbor == start:
+                cycle = [node]
+                while parents[cycle[-1]] is not None:
+                    cycle.append(parents[cycle[-1]])
+                return cycle[::-1] + [start]
+            if labels[neighbor] == component and neighbor not in parents:
+                parents[neighbor] = node
+                queue.append(neighbor)
+    return []
+
+def analyze_graph(graph, programs):
+    """
+    Compute the analysis results for a DependencyGraph, with program names and funding taken from
+    the all_programs rows in programs. Returns a JSON-serializable dict.
+    """
+    programs = programs.set_index('id').reindex(graph.ids)
+    names = programs['short_name'].where(programs['short_name'].notna(), None).tolist()
+    funding = pd.to_numeric(programs['total_funding_m'], errors='coerce').fillna(0).to_numpy()
+
+    labels, count = graph.strongly_connected_components()
+    sizes = np.bincount(labels, minlength=count)
+    condensed = condense(graph, labels, count)
+
+    # A component's funding is that of all its programs, as a chain entering a cycle can pass through all of them
+    component_depth, component_best, next_component = topological_levels(condensed, count, np.bincount(labels, weights=funding, minlength=count))
+
+    def describe(nodes):
+        return [{'id': int(graph.ids[node]), 'short_name': names[node]} for node in nodes]
+
+    # Components with more than one program, plus programs that depend on themselves
+    self_loops = graph.edge_sources[graph.edge_sources == graph.edge_targets]
+    cyclic = np.union1d(np.flatnonzero(sizes > 1), labels[self_loops])
+    member_offsets, member_nodes = build_csr(labels, np.arange(len(labels)), count)
+
+    def members(component):
+        return member_nodes[member_offsets[component]:member_offsets[component + 1]].tolist()
+
+    cycles = []
+    for component in cyclic.tolist():
+        nodes = members(component)
+        cycles.append({
+            'size': len(nodes),
+            'programs': describe(nodes),
+            'example': describe(example_cycle(graph, labels, nodes[0])),
+        })
+    cycles.sort(key=lambda cycle: -cycle['size'])
+
+    # Follow the heaviest chain of components from its top
+    critical_path = []
+    component = int(np.argmax(component_best)) if count else -1
+    path_funding = float(component_best[component]) if count else 0.0
+    while component != -1:
+        for node in members(component):
+            critical_path.append({
+                'id': int(graph.ids[node]),
+                'short_name': names[node],
+                'total_funding_m': float(funding[node]),
+                'depth': int(component_depth[component]),
+            })
+        component = int(next_component[component])
+
+    depth = component_depth[labels]
+    return {
+        'programs': graph.num_programs,
+        'edges': graph.num_edges,
+        'components': int(count),
+        'cycles': cycles,
+        'max_depth': int(depth.max()) if len(depth) else 0,
+        'depth': {'id': graph.ids.tolist(), 'depth': depth.tolist()},
+        'critical_path': {'funding_m': path_funding, 'programs': critical_path},
+    }
+
+def run_analysis(engine=None, force=False, cache_dir=ANALYSIS_CACHE_DIR):
+    """
+    Return the analysis of the current tables, reading it from the cache when the table fingerprint
+    matches a previous run. force=True always recomputes.
+    """
+    engine = engine or get_postgres_engine()
+    fingerprint = get_table_fingerprint(engine)
+    cache_path = os.path.join(cache_dir, f"{fingerprint}.json")
+    if not force and os.path.exists(cache_path):
+        logging.info(f"Dependency graph unchanged (fingerprint {fingerprint}); using cached analysis.")
+        with open(cache_path) as f:
+            return json.load(f)
+
+    try:
+        with engine.connect() as conn:
+            programs = pd.read_sql(PROGRAMS_QUERY, conn)
+    except Exception as e:
+        logging.error(f"Error reading programs: {e}")
+        raise e
+    graph = load_dependency_graph(engine, program_ids=programs['id'])
+    result = analyze_graph(graph, programs)
+    result['fingerprint'] = fingerprint
+
+    write_json(cache_path, result)
+    return result
+
+def format_report(result, top=10):
+    """
+    Build the human-readable report lines for an analysis result.
+    """
+    def name(program):
+        return program['short_name'] or f"#{program['id']}"
+
+    lines = [
+        f"Programs: {result['programs']}, dependencies: {result['edges']}, "
+        f"strongly connected components: {result['components']}",
+        f"Cycles: {len(result['cycles'])}",
+    ]
+    for cycle in result['cycles'][:top]:
+        lines.append(f"  {cycle['size']} programs: {' -> '.join(name(program) for program in cycle['example'])}")
+    if len(result['cycles']) > top:
+        lines.append(f"  ... and {len(result['cycles']) - top} more")
+
+    lines.append(f"Maximum topological depth: {result['max_depth']}")
+    depth = pd.Series(result['depth']['depth'], index=result['depth']['id'])
+    for program_id, program_depth in depth.nlargest(top).items():
+        lines.append(f"  {program_id}: depth {program_depth}")
+
+    critical_path = result['critical_path']
+    lines.append(f"Critical path (${critical_path['funding_m']:.2f}M over {len(critical_path['programs'])} programs):")
+    lines.append("  " + " -> ".join(name(program) for program in critical_path['programs']))
+    return lines
+
+def main(argv=None):
+    """
+    Print the dependency graph analysis. Exits with status 1 under --fail-on-cycles when there are cycles.
+    """
+    parser = argparse.ArgumentParser(description="Analyze cycles, depth and the critical path of program dependencies.")
+    parser.add_argument('--force', action='store_true', help="Recompute even if a cached analysis matches the tables.")
+    parser.add_argument('--top', type=int, default=10, help="Number of cycles and deepest programs to list.")
+    parser.add_argument('--fail-on-cycles', action='store_true',
+                        help="Exit with status 1 when dependencies contain cycles (the Sankey layout cannot draw them).")
+    args = parser.parse_args(argv)
+
+    with postgres_engine_scope():
+        result = run_analysis(force=args.force)
+    print("\n".join(format_report(result, top=args.top)))
+
+    if args.fail_on_cycles and result['cycles']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
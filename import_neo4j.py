@@ -1,8 +1,16 @@
 import os
+import time
+import heapq
+import functools
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from neo4j import GraphDatabase
+from neo4j.exceptions import TransientError, ServiceUnavailable, SessionExpired
 from dotenv import load_dotenv
-from db_connection import get_postgres_engine
+from db_connection import get_postgres_engine, postgres_engine_scope
 import logging
 
 # Set up logging
@@ -16,17 +24,39 @@ NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
-# Initialize PostgreSQL connection
-engine = get_postgres_engine()
+# Number of rows sent to Neo4j per UNWIND batch
+BATCH_SIZE = int(os.getenv('NEO4J_BATCH_SIZE', 5000))
 
-# Initialize Neo4j driver
-neo4j_driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+# Concurrent sessions used to load relationships
+WORKERS = int(os.getenv('NEO4J_WORKERS', 4))
+
+# Node-disjoint partitions are used only when the heaviest holds at most this multiple of an even share of the rows
+MAX_PARTITION_IMBALANCE = 2
+
+# Attempts per batch before a transient Neo4j error (e.g. a deadlock) is given up on
+MAX_RETRIES = int(os.getenv('NEO4J_MAX_RETRIES', 5))
+
+@functools.lru_cache(maxsize=None)
+def get_neo4j_driver():
+    """
+    Return the Neo4j driver, created on first use and shared by every session.
+    """
+    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+
+def close_neo4j_driver():
+    """
+    Close the cached Neo4j driver, if one was created.
+    """
+    if get_neo4j_driver.cache_info().currsize:
+        get_neo4j_driver().close()
+        get_neo4j_driver.cache_clear()
 
 def extract_data_from_postgres():
     """
     Extract data from PostgreSQL tables into DataFrames.
     """
     logging.info("Extracting data from PostgreSQL...")
+    engine = get_postgres_engine()
     
     all_programs_df = pd.read_sql("SELECT * FROM all_programs", engine)
     program_dependencies_df = pd.read_sql("SELECT * FROM program_dependencies", engine)
@@ -35,59 +65,415 @@ def extract_data_from_postgres():
     
     return all_programs_df, program_dependencies_df, program_company_df, company_df
 
-def load_data_into_neo4j(all_programs_df, program_dependencies_df, program_company_df, company_df):
+# Program properties copied onto the Program nodes
+PROGRAM_PROPERTIES = [
+    'id', 'program_name', 'short_name', 'org', 'description', 'impact', 'status', 'total_funding_m',
+    'start_year', 'end_year', 'theme', 'importance', 'notes_with_applied'
+]
+
+# Constraints and indexes ensured before loading, so the MERGE and MATCH lookups are index seeks
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT program_id_unique IF NOT EXISTS FOR (p:Program) REQUIRE p.id IS UNIQUE",
+    "CREATE CONSTRAINT company_id_unique IF NOT EXISTS FOR (c:Company) REQUIRE c.id IS UNIQUE",
+    "CREATE INDEX program_short_name IF NOT EXISTS FOR (p:Program) ON (p.short_name)",
+    "CREATE INDEX program_theme IF NOT EXISTS FOR (p:Program) ON (p.theme)",
+]
+
+# Seconds to wait for new indexes to come online
+INDEX_WAIT_SECONDS = 300
+
+def ensure_schema(session, timeout=INDEX_WAIT_SECONDS):
+    """
+    Create the uniqueness constraints and indexes if missing and wait until they are online.
+    """
+    for statement in SCHEMA_STATEMENTS:
+        session.run(statement).consume()
+    session.run("CALL db.awaitIndexes($timeout)", timeout=timeout).consume()
+    logging.info("Neo4j constraints and indexes are online.")
+
+def dataframe_to_rows(df, columns=None):
+    """
+    Convert a DataFrame into a list of parameter maps for Cypher, with missing values as None.
+    """
+    if columns is not None:
+        df = df[columns]
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+def _run_batch(tx, query, rows):
+    tx.run(query, rows=rows).consume()
+
+def write_batch(session, query, batch, max_retries=MAX_RETRIES):
+    """
+    Run one batch in a write transaction, retrying with backoff on transient errors.
+    """
+    for attempt in range(1, max_retries + 1):
+        try:
+            session.execute_write(_run_batch, query, batch)
+            return
+        except (TransientError, ServiceUnavailable, SessionExpired) as e:
+            if attempt == max_retries:
+                logging.error(f"Giving up on a batch of {len(batch)} rows after {attempt} attempts: {e}")
+                raise
+            # Jitter the backoff so workers that failed together do not retry in lock step
+            delay = min(0.2 * 2 ** attempt, 10) * (1 + random.random())
+            logging.warning(f"Transient Neo4j error (attempt {attempt}/{max_retries}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+def write_in_batches(session, query, rows, label, batch_size=BATCH_SIZE, max_retries=MAX_RETRIES):
+    """
+    Send rows to Neo4j through an UNWIND $rows query, one explicit write transaction per batch.
+    """
+    total = len(rows)
+    for start in range(0, total, batch_size):
+        batch = rows[start:start + batch_size]
+        batch_start = time.perf_counter()
+        write_batch(session, query, batch, max_retries)
+        elapsed = time.perf_counter() - batch_start
+        rows_per_sec = len(batch) / elapsed if elapsed > 0 else float('inf')
+        logging.info(f"{label}: wrote {start + len(batch)}/{total} rows ({len(batch)} in {elapsed:.2f}s, {rows_per_sec:,.0f} rows/sec).")
+
+# Cypher used by both the full load and the differential sync
+PROGRAM_MERGE_QUERY = """
+    UNWIND $rows AS row
+    MERGE (p:Program {id: row.id})
+    SET p.program_name = row.program_name,
+        p.short_name = row.short_name,
+        p.org = row.org,
+        p.description = row.description,
+        p.impact = row.impact,
+        p.status = row.status,
+        p.total_funding_m = row.total_funding_m,
+        p.start_year = row.start_year,
+        p.end_year = row.end_year,
+        p.theme = row.theme,
+        p.importance = row.importance,
+        p.notes_with_applied = row.notes_with_applied,
+        p.sync_hash = row.sync_hash
+"""
+
+COMPANY_MERGE_QUERY = """
+    UNWIND $rows AS row
+    MERGE (c:Company {id: row.id})
+    SET c.name = row.name,
+        c.sync_hash = row.sync_hash
+"""
+
+ASSOCIATED_WITH_MERGE_QUERY = """
+    UNWIND $rows AS row
+    MATCH (p:Program {id: row.program_id})
+    MATCH (c:Company {id: row.company_id})
+    MERGE (p)-[:ASSOCIATED_WITH]->(c)
+"""
+
+DEPENDS_ON_MERGE_QUERY = """
+    UNWIND $rows AS row
+    MATCH (p1:Program {id: row.program_id})
+    MATCH (p2:Program {id: row.dependency_id})
+    MERGE (p1)-[:DEPENDS_ON]->(p2)
+"""
+
+def with_sync_hash(df, columns):
+    """
+    Return the given columns plus a 'sync_hash' fingerprint of each row, stored on the nodes to detect changes.
+    """
+    df = df[columns].copy()
+    df['sync_hash'] = pd.util.hash_pandas_object(df, index=False).map('{:016x}'.format)
+    return df
+
+def _read_rows(tx, query, columns):
+    return pd.DataFrame(tx.run(query).data(), columns=columns)
+
+def _delete_chunk(tx, limit):
+    return tx.run("MATCH (n) WITH n LIMIT $limit DETACH DELETE n RETURN count(*) AS deleted", limit=limit).single()['deleted']
+
+def clear_graph(session, batch_size=BATCH_SIZE):
+    """
+    Delete every node and relationship in chunks of batch_size nodes, one transaction per chunk.
+    """
+    total = 0
+    while True:
+        deleted = session.execute_write(_delete_chunk, batch_size)
+        if deleted == 0:
+            break
+        total += deleted
+        logging.info(f"Deleted {total} nodes so far...")
+    logging.info(f"Existing data in Neo4j has been cleared ({total} nodes).")
+
+def connected_components(start_nodes, end_nodes, num_nodes):
+    """
+    Label every node of an undirected graph given as edge arrays with the smallest node index of its
+    connected component, by hooking each edge's endpoints onto the smaller label and pointer jumping.
+    """
+    labels = np.arange(num_nodes)
+    while True:
+        smaller = np.minimum(labels[start_nodes], labels[end_nodes])
+        previous = labels.copy()
+        np.minimum.at(labels, start_nodes, smaller)
+        np.minimum.at(labels, end_nodes, smaller)
+        # Point every node straight at the root of its label tree
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+def partition_by_start_range(df, partitions):
+    """
+    Split relationship rows into at most `partitions` groups of consecutive start node ids (program_id
+    ranges) with about the same number of rows. Every start node is in one group only; end nodes may
+    be shared, so concurrent workers can still deadlock on them and rely on write_batch's retries.
+    """
+    start_ids = df.iloc[:, 0].to_numpy()
+    order = np.argsort(start_ids, kind='stable')
+    sorted_ids = start_ids[order]
+    # Move every even cut back to the first row of its id, so an id's rows are never split
+    cuts = np.searchsorted(sorted_ids, sorted_ids[[len(df) * i // partitions for i in range(1, partitions)]], side='left')
+    bounds = np.unique(np.concatenate([[0], cuts, [len(df)]]))
+    return [df.iloc[np.sort(order[start:end])] for start, end in zip(bounds[:-1], bounds[1:])]
+
+def partition_relationships(df, partitions, same_label=False):
+    """
+    Split relationship rows (start node id, end node id) into at most `partitions` groups for concurrent
+    workers. When the connected components spread evenly, all relationships of a component land in the
+    same group, so the groups' nodes are disjoint and workers never lock the same node; components are
+    spread largest first over the smallest group. same_label=True when both ids refer to the same kind
+    of node, as for DEPENDS_ON between Programs. When one component dominates, as on densely connected
+    data, the rows are split by start node id ranges instead (see partition_by_start_range).
+    """
+    if df.empty:
+        return []
+    start_column, end_column = df.columns[:2]
+    if same_label:
+        codes, uniques = pd.factorize(np.concatenate([df[start_column].to_numpy(), df[end_column].to_numpy()]))
+        start_nodes, end_nodes, num_nodes = codes[:len(df)], codes[len(df):], len(uniques)
+    else:
+        start_nodes, start_uniques = pd.factorize(df[start_column])
+        end_nodes, end_uniques = pd.factorize(df[end_column])
+        end_nodes = end_nodes + len(start_uniques)
+        num_nodes = len(start_uniques) + len(end_uniques)
+
+    labels = connected_components(start_nodes, end_nodes, num_nodes)
+    _, row_components, sizes = np.unique(labels[start_nodes], return_inverse=True, return_counts=True)
+
+    loads = [(0, partition) for partition in range(min(partitions, len(sizes)))]
+    assignment = np.empty(len(sizes), dtype=np.int64)
+    for component in np.argsort(-sizes, kind='stable').tolist():
+        load, partition = heapq.heappop(loads)
+        assignment[component] = partition
+        heapq.heappush(loads, (load + int(sizes[component]), partition))
+
+    if max(load for load, _ in loads) > MAX_PARTITION_IMBALANCE * len(df) / partitions:
+        logging.info(f"The largest connected component holds {sizes.max()} of {len(df)} rows; partitioning by {start_column} ranges instead.")
+        return partition_by_start_range(df, partitions)
+    return [group for _, group in df.groupby(assignment[row_components], sort=True)]
+
+def _write_partition(query, rows, label, batch_size):
+    with get_neo4j_driver().session() as session:
+        write_in_batches(session, query, rows, label, batch_size)
+
+def write_relationships_in_parallel(query, df, label, batch_size=BATCH_SIZE, workers=WORKERS, same_label=False):
+    """
+    Load relationship rows concurrently, one session per partition from partition_relationships: node-disjoint
+    connected components when they balance the load, start node id ranges otherwise.
+    """
+    partitions = partition_relationships(df, workers, same_label)
+    if len(partitions) <= 1:
+        _write_partition(query, dataframe_to_rows(df), label, batch_size)
+        return
+
+    with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+        futures = [
+            executor.submit(_write_partition, query, dataframe_to_rows(partition),
+                            f"{label} [partition {i + 1}/{len(partitions)}]", batch_size)
+            for i, partition in enumerate(partitions)
+        ]
+        for future in futures:
+            future.result()
+
+def load_data_into_neo4j(all_programs_df, program_dependencies_df, program_company_df, company_df,
+                         batch_size=BATCH_SIZE, sync=False, workers=WORKERS):
     """
     Load data into Neo4j from DataFrames.
+    By default the graph is cleared and reloaded; with sync=True only the differences are written.
     """
     logging.info("Loading data into Neo4j...")
-    
-    with neo4j_driver.session() as session:
+
+    programs_df = with_sync_hash(all_programs_df, PROGRAM_PROPERTIES)
+    companies_df = with_sync_hash(company_df, ['id', 'name'])
+    associations_df = program_company_df[['program_id', 'company_id']].drop_duplicates()
+    dependencies_df = program_dependencies_df[['program_id', 'dependency_id']].drop_duplicates()
+
+    with get_neo4j_driver().session() as session:
+        # Ensure constraints and indexes exist before any MERGE or MATCH
+        ensure_schema(session)
+
+        if sync:
+            sync_graph(session, programs_df, companies_df, associations_df, dependencies_df, batch_size, workers)
+            return
+
         # Clear existing data
-        session.run("MATCH (n) DETACH DELETE n")
-        logging.info("Existing data in Neo4j has been cleared.")
+        clear_graph(session, batch_size)
 
         # Create Program nodes
-        for _, row in all_programs_df.iterrows():
-            session.run("""
-                MERGE (p:Program {id: $id})
-                SET p.program_name = $program_name,
-                    p.short_name = $short_name,
-                    p.org = $org,
-                    p.description = $description,
-                    p.impact = $impact,
-                    p.status = $status,
-                    p.total_funding_m = $total_funding_m,
-                    p.start_year = $start_year,
-                    p.end_year = $end_year,
-                    p.theme = $theme,
-                    p.importance = $importance,
-                    p.notes_with_applied = $notes_with_applied
-            """, parameters=row.to_dict())
+        write_in_batches(session, PROGRAM_MERGE_QUERY, dataframe_to_rows(programs_df), "Program nodes", batch_size)
         
         # Create Company nodes and relationships
-        for _, row in company_df.iterrows():
-            session.run("MERGE (c:Company {id: $id, name: $name})", parameters=row.to_dict())
-
-        for _, row in program_company_df.iterrows():
-            session.run("""
-                MATCH (p:Program {id: $program_id})
-                MATCH (c:Company {id: $company_id})
-                MERGE (p)-[:ASSOCIATED_WITH]->(c)
-            """, parameters=row.to_dict())
+        write_in_batches(session, COMPANY_MERGE_QUERY, dataframe_to_rows(companies_df), "Company nodes", batch_size)
+        write_relationships_in_parallel(ASSOCIATED_WITH_MERGE_QUERY, associations_df,
+                                        "ASSOCIATED_WITH relationships", batch_size, workers)
 
         # Create Dependency relationships
-        for _, row in program_dependencies_df.iterrows():
-            session.run("""
-                MATCH (p1:Program {id: $program_id})
-                MATCH (p2:Program {id: $dependency_id})
-                MERGE (p1)-[:DEPENDS_ON]->(p2)
-            """, parameters=row.to_dict())
+        write_relationships_in_parallel(DEPENDS_ON_MERGE_QUERY, dependencies_df,
+                                        "DEPENDS_ON relationships", batch_size, workers, same_label=True)
+
+def diff_nodes(session, label, df):
+    """
+    Compare node rows against the graph by id and sync hash.
+    Returns the rows to create or update and the ids of nodes to delete.
+    """
+    current_df = session.execute_read(_read_rows, f"MATCH (n:{label}) RETURN n.id AS id, n.sync_hash AS sync_hash",
+                                      ['id', 'sync_hash'])
+    merged = df[['id', 'sync_hash']].merge(current_df, on='id', how='left', suffixes=('', '_current'))
+    changed_df = df[(merged['sync_hash'] != merged['sync_hash_current']).to_numpy()]
+    removed_ids = current_df.loc[~current_df['id'].isin(df['id']), 'id']
+    logging.info(f"{label} nodes: {len(changed_df)} to create or update, {len(removed_ids)} to delete, {len(df) - len(changed_df)} unchanged.")
+    return changed_df, pd.DataFrame({'id': removed_ids})
+
+def diff_relationships(session, query, df):
+    """
+    Compare relationship rows against the pairs currently in the graph.
+    Returns the rows to create and the rows to delete.
+    """
+    current_df = session.execute_read(_read_rows, query, list(df.columns))
+    merged = df.merge(current_df, on=list(df.columns), how='outer', indicator=True)
+    missing_df = merged.loc[merged['_merge'] == 'left_only', df.columns]
+    extra_df = merged.loc[merged['_merge'] == 'right_only', df.columns]
+    return missing_df, extra_df
+
+def sync_graph(session, programs_df, companies_df, associations_df, dependencies_df, batch_size=BATCH_SIZE, workers=WORKERS):
+    """
+    Bring the graph in line with PostgreSQL by writing only the nodes and relationships that changed.
+    """
+    changed_programs_df, removed_programs_df = diff_nodes(session, 'Program', programs_df)
+    changed_companies_df, removed_companies_df = diff_nodes(session, 'Company', companies_df)
+    missing_associations_df, extra_associations_df = diff_relationships(session, """
+        MATCH (p:Program)-[:ASSOCIATED_WITH]->(c:Company) RETURN p.id AS program_id, c.id AS company_id
+    """, associations_df)
+    missing_dependencies_df, extra_dependencies_df = diff_relationships(session, """
+        MATCH (p1:Program)-[:DEPENDS_ON]->(p2:Program) RETURN p1.id AS program_id, p2.id AS dependency_id
+    """, dependencies_df)
+    logging.info(f"ASSOCIATED_WITH relationships: {len(missing_associations_df)} to create, {len(extra_associations_df)} to delete.")
+    logging.info(f"DEPENDS_ON relationships: {len(missing_dependencies_df)} to create, {len(extra_dependencies_df)} to delete.")
+
+    # Create or update nodes first, so new relationships can match both ends
+    write_in_batches(session, PROGRAM_MERGE_QUERY, dataframe_to_rows(changed_programs_df), "Program nodes", batch_size)
+    write_in_batches(session, COMPANY_MERGE_QUERY, dataframe_to_rows(changed_companies_df), "Company nodes", batch_size)
+
+    # Drop relationships that no longer exist, then create the new ones
+    write_in_batches(session, """
+        UNWIND $rows AS row
+        MATCH (p:Program {id: row.program_id})-[r:ASSOCIATED_WITH]->(c:Company {id: row.company_id})
+        DELETE r
+    """, dataframe_to_rows(extra_associations_df), "Deleted ASSOCIATED_WITH relationships", batch_size)
+    write_in_batches(session, """
+        UNWIND $rows AS row
+        MATCH (p1:Program {id: row.program_id})-[r:DEPENDS_ON]->(p2:Program {id: row.dependency_id})
+        DELETE r
+    """, dataframe_to_rows(extra_dependencies_df), "Deleted DEPENDS_ON relationships", batch_size)
+    write_relationships_in_parallel(ASSOCIATED_WITH_MERGE_QUERY, missing_associations_df,
+                                    "ASSOCIATED_WITH relationships", batch_size, workers)
+    write_relationships_in_parallel(DEPENDS_ON_MERGE_QUERY, missing_dependencies_df,
+                                    "DEPENDS_ON relationships", batch_size, workers, same_label=True)
+
+    # Finally remove nodes that are gone from PostgreSQL, with any remaining relationships
+    write_in_batches(session, """
+        UNWIND $rows AS row
+        MATCH (p:Program {id: row.id})
+        DETACH DELETE p
+    """, dataframe_to_rows(removed_programs_df), "Deleted Program nodes", batch_size)
+    write_in_batches(session, """
+        UNWIND $rows AS row
+        MATCH (c:Company {id: row.id})
+        DETACH DELETE c
+    """, dataframe_to_rows(removed_companies_df), "Deleted Company nodes", batch_size)
+
+# Directory the CSVs for an offline neo4j-admin import are written to
+EXPORT_DIR = 'neo4j_import'
+
+# neo4j-admin header type annotations of Program properties that are not strings
+PROGRAM_HEADER_TYPES = {'id': 'ID(Program)', 'total_funding_m': 'double', 'start_year': 'date', 'end_year': 'date'}
+
+def export_for_admin_import(all_programs_df, program_dependencies_df, program_company_df, company_df, export_dir=EXPORT_DIR):
+    """
+    Write node and relationship CSVs with neo4j-admin headers for an offline 'database import full'.
+    Returns the neo4j-admin command that imports them.
+    """
+    os.makedirs(export_dir, exist_ok=True)
+
+    programs_df = with_sync_hash(all_programs_df, PROGRAM_PROPERTIES)
+    programs_df.columns = [f"{col}:{PROGRAM_HEADER_TYPES[col]}" if col in PROGRAM_HEADER_TYPES else col
+                           for col in programs_df.columns]
+
+    companies_df = with_sync_hash(company_df, ['id', 'name'])
+    companies_df.columns = ['id:ID(Company)', 'name', 'sync_hash']
+
+    associations_df = program_company_df[['program_id', 'company_id']].drop_duplicates()
+    associations_df.columns = [':START_ID(Program)', ':END_ID(Company)']
+
+    dependencies_df = program_dependencies_df[['program_id', 'dependency_id']].drop_duplicates()
+    dependencies_df.columns = [':START_ID(Program)', ':END_ID(Program)']
+
+    files = {
+        'programs.csv': programs_df,
+        'companies.csv': companies_df,
+        'associated_with.csv': associations_df,
+        'depends_on.csv': dependencies_df,
+    }
+    for file_name, df in files.items():
+        df.to_csv(os.path.join(export_dir, file_name), index=False)
+        logging.info(f"Wrote {len(df)} rows to {os.path.join(export_dir, file_name)}.")
+
+    return (
+        "neo4j-admin database import full neo4j --overwrite-destination --id-type=INTEGER --multiline-fields=true "
+        f"--nodes=Program={os.path.join(export_dir, 'programs.csv')} "
+        f"--nodes=Company={os.path.join(export_dir, 'companies.csv')} "
+        f"--relationships=ASSOCIATED_WITH={os.path.join(export_dir, 'associated_with.csv')} "
+        f"--relationships=DEPENDS_ON={os.path.join(export_dir, 'depends_on.csv')}"
+    )
+
+def main(argv=None):
+    """
+    Extract the program data from PostgreSQL and load or export it for Neo4j.
+    """
+    parser = argparse.ArgumentParser(description="Load the PostgreSQL program data into Neo4j.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows sent to Neo4j per UNWIND batch.")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="Concurrent Neo4j sessions used to load relationships.")
+    parser.add_argument('--sync', action='store_true',
+                        help="Write only the nodes and relationships that differ from PostgreSQL instead of reloading the graph.")
+    parser.add_argument('--export', nargs='?', const=EXPORT_DIR, metavar='DIR',
+                        help=f"Write CSVs for an offline neo4j-admin import to DIR (default {EXPORT_DIR}) instead of loading Neo4j.")
+    args = parser.parse_args(argv)
 
-if __name__ == "__main__":
     # Extract data from PostgreSQL
-    all_programs_df, program_dependencies_df, program_company_df, company_df = extract_data_from_postgres()
+    with postgres_engine_scope():
+        all_programs_df, program_dependencies_df, program_company_df, company_df = extract_data_from_postgres()
     
+    if args.export:
+        # Export data for neo4j-admin instead of loading it through Cypher
+        command = export_for_admin_import(all_programs_df, program_dependencies_df, program_company_df, company_df, args.export)
+        logging.info(f"Stop the database, then import with:\n{command}")
+        return
+
     # Load data into Neo4j
-    load_data_into_neo4j(all_programs_df, program_dependencies_df, program_company_df, company_df)
+    try:
+        load_data_into_neo4j(all_programs_df, program_dependencies_df, program_company_df, company_df,
+                             batch_size=args.batch_size, sync=args.sync, workers=args.workers)
+    finally:
+        close_neo4j_driver()
 
     logging.info("ETL process completed successfully.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# pipeline.py
+# runs get_data -> import_neo4j -> build_d3 -> save_svgs, skipping every stage whose inputs
+# (sheet content, table checksums, code) are unchanged since its last run. The outputs of build_d3
+# and save_svgs are kept under a directory named by their input hash, so returning to earlier
+# inputs restores them instead of rebuilding. Only the files a stage writes are ever replaced or
+# removed, never the directories holding them.
+
+import os
+import glob
+import json
+import shutil
+import hashlib
+import argparse
+import logging
+from db_connection import get_postgres_engine, postgres_engine_scope
+from data_formatter import LOADED_TABLES, table_checksums
+from atomic_files import write_json
+import get_data
+import build_d3
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Directory holding the pipeline state and the hash-addressed artifacts
+PIPELINE_CACHE_DIR = os.getenv('PIPELINE_CACHE_DIR', os.path.join('.cache', 'pipeline'))
+STATE_FILE = 'state.json'
+
+# Number of artifact directories kept per stage; older ones are removed after each run
+KEEP_ARTIFACTS = int(os.getenv('PIPELINE_KEEP_ARTIFACTS', '5'))
+
+# Directory the SVGs are written to, and the names of the files save_svgs writes there
+SVG_DIR = 'svgs'
+SVG_PATTERN = 'sankey_*.svg'
+
+# Source files whose content is part of each stage's fingerprint
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+GET_DATA_CODE = ['get_data.py', 'data_formatter.py', 'db_connection.py']
+IMPORT_NEO4J_CODE = ['import_neo4j.py', 'db_connection.py']
+BUILD_D3_CODE = ['build_d3.py', 'sankey_layout.py', 'atomic_files.py', 'db_connection.py']
+SAVE_SVGS_CODE = ['save_svgs.py', 'sankey_layout.py', 'sankey-diagram.html']
+
+STAGES = ['get_data', 'import_neo4j', 'build_d3', 'save_svgs']
+
+def code_version(files):
+    """
+    Return a hash of the contents of the given source files.
+    """
+    digest = hashlib.sha256()
+    for file_name in files:
+        with open(os.path.join(CODE_DIR, file_name), 'rb') as f:
+            digest.update(file_name.encode('utf-8') + b'\0' + f.read() + b'\0')
+    return digest.hexdigest()
+
+def stage_key(stage, *inputs):
+    """
+    Return the content address of a stage run: a hash of the stage name and its input fingerprints.
+    """
+    return hashlib.sha256('\0'.join((stage,) + inputs).encode('utf-8')).hexdigest()[:16]
+
+def load_state(cache_dir=PIPELINE_CACHE_DIR):
+    """
+    Return {stage: key of its last completed run}.
+    """
+    path = os.path.join(cache_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(state, cache_dir=PIPELINE_CACHE_DIR):
+    write_json(os.path.join(cache_dir, STATE_FILE), state, indent=4)
+
+def owned_files(directory, pattern):
+    """
+    Return the paths of the files in directory whose names match the glob pattern.
+    """
+    return sorted(path for path in glob.glob(os.path.join(glob.escape(directory), pattern)) if os.path.isfile(path))
+
+def replace_files(source_dir, destination_dir, pattern):
+    """
+    Make the files matching pattern in destination_dir those of source_dir, leaving every other file alone.
+    """
+    os.makedirs(destination_dir, exist_ok=True)
+    for path in owned_files(destination_dir, pattern):
+        os.remove(path)
+    for path in owned_files(source_dir, pattern):
+        shutil.copy2(path, os.path.join(destination_dir, os.path.basename(path)))
+
+def prune_artifacts(stage_dir, keep_key, keep=KEEP_ARTIFACTS):
+    """
+    Remove all but the keep most recently used artifact directories of a stage, never keep_key's.
+    """
+    entries = [entry for entry in os.scandir(stage_dir) if entry.is_dir() and entry.name != keep_key]
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in entries[max(keep - 1, 0):]:
+        shutil.rmtree(entry.path)
+        logging.info(f"Removed cached outputs {entry.path}.")
+
+def run_stage(stage, key, run, state, force=False, cache_dir=PIPELINE_CACHE_DIR):
+    """
+    Run a stage without file outputs unless its last completed run had the same key.
+    """
+    if not force and state.get(stage) == key:
+        logging.info(f"{stage}: inputs unchanged ({key}); skipping.")
+        return False
+    logging.info(f"{stage}: running ({key})...")
+    run()
+    state[stage] = key
+    save_state(state, cache_dir)
+    return True
+
+def run_cached_stage(stage, key, run, outputs, state, force=False, cache_dir=PIPELINE_CACHE_DIR):
+    """
+    Bring a stage's outputs up to date for key. outputs is a list of (directory, pattern) pairs naming
+    the files the stage writes. Nothing is done when they were produced by the last run; otherwise
+    they are restored from the artifact directory of key when it exists, and produced by run() and
+    stored there when it does not.
+    """
+    stage_dir = os.path.join(cache_dir, 'artifacts', stage)
+    artifact_dir = os.path.join(stage_dir, key)
+    if not force and state.get(stage) == key and all(owned_files(directory, pattern) for directory, pattern in outputs):
+        logging.info(f"{stage}: inputs unchanged ({key}); skipping.")
+        return False
+
+    if not force and os.path.isdir(artifact_dir):
+        logging.info(f"{stage}: restoring cached outputs from {artifact_dir}.")
+        for index, (directory, pattern) in enumerate(outputs):
+            replace_files(os.path.join(artifact_dir, str(index)), directory, pattern)
+        # Mark the artifacts as recently used so pruning keeps them
+        os.utime(artifact_dir)
+    else:
+        logging.info(f"{stage}: running ({key})...")
+        run()
+
+        # Store the outputs next to the artifact directory and rename them into place once complete
+        tmp_dir = f"{artifact_dir}.tmp"
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        for index, (directory, pattern) in enumerate(outputs):
+            replace_files(directory, os.path.join(tmp_dir, str(index)), pattern)
+        if os.path.isdir(artifact_dir):
+            shutil.rmtree(artifact_dir)
+        os.replace(tmp_dir, artifact_dir)
+
+    state[stage] = key
+    save_state(state, cache_dir)
+    prune_artifacts(stage_dir, key, KEEP_ARTIFACTS)
+    return True
+
+def run_pipeline(force=False, skip=(), incremental=False, neo4j_sync=False, svg_dir=SVG_DIR, cache_dir=PIPELINE_CACHE_DIR):
+    """
+    Run the pipeline stages in order, each only when its inputs changed. The stage scripts are called
+    in-process; import_neo4j and save_svgs are only imported when they run.
+    """
+    state = load_state(cache_dir)
+
+    if 'get_data' not in skip:
+        # The sheet is only downloaded when its Drive revision changed
+        key = stage_key('get_data', get_data.get_sheet_fingerprint(), code_version(GET_DATA_CODE))
+
+        def load_sheet():
+            # The pipeline already decided the tables need rebuilding; the sheet was fetched with the fingerprint
+            get_data.main(['--rebuild'] + (['--incremental'] if incremental else []))
+
+        run_stage('get_data', key, load_sheet, state, force, cache_dir)
+
+    checksums = table_checksums(get_postgres_engine())
+
+    if 'import_neo4j' not in skip:
+        key = stage_key('import_neo4j', *(checksums[table] for table in LOADED_TABLES), code_version(IMPORT_NEO4J_CODE))
+
+        def load_neo4j():
+            import import_neo4j
+            import_neo4j.main(['--sync'] if neo4j_sync else [])
+
+        run_stage('import_neo4j', key, load_neo4j, state, force, cache_dir)
+
+    build_key = stage_key('build_d3', checksums['all_programs'], checksums['program_dependencies'], code_version(BUILD_D3_CODE))
+    if 'build_d3' not in skip:
+        run_cached_stage('build_d3', build_key, lambda: build_d3.main([]),
+                         [('.', 'flow_data.json'), (build_d3.FLOW_SHARD_DIR, '*.json')], state, force, cache_dir)
+
+    if 'save_svgs' not in skip:
+        key = stage_key('save_svgs', build_key, code_version(SAVE_SVGS_CODE))
+
+        def render_svgs():
+            import save_svgs
+            # Render into a fresh directory inside the cache, then replace only the SVG files in svg_dir,
+            # so SVGs of removed themes do not linger and nothing else in svg_dir is touched
+            render_dir = os.path.join(cache_dir, 'render.tmp')
+            if os.path.isdir(render_dir):
+                shutil.rmtree(render_dir)
+            save_svgs.main(['--output-dir', render_dir])
+            replace_files(render_dir, svg_dir, SVG_PATTERN)
+            shutil.rmtree(render_dir)
+
+        run_cached_stage('save_svgs', key, render_svgs, [(svg_dir, SVG_PATTERN)], state, force, cache_dir)
+
+def main(argv=None):
+    """
+    Refresh everything derived from the program sheet, skipping stages whose inputs are unchanged.
+    """
+    parser = argparse.ArgumentParser(description="Run the data pipeline, reusing the outputs of unchanged stages.")
+    parser.add_argument('--force', action='store_true', help="Run every stage even if its inputs are unchanged.")
+    parser.add_argument('--skip', action='append', choices=STAGES, default=[], help="Stage to leave out (repeatable).")
+    parser.add_argument('--incremental', action='store_true', help="Run get_data with --incremental (write only the changed rows).")
+    parser.add_argument('--neo4j-sync', action='store_true', help="Run import_neo4j with --sync (write only the differences).")
+    parser.add_argument('--svg-dir', default=SVG_DIR, help="Directory the SVGs are written to; only its sankey_*.svg files are replaced.")
+    args = parser.parse_args(argv)
+
+    # Stages called in-process share one pool, closed when the whole pipeline is done
+    with postgres_engine_scope():
+        run_pipeline(force=args.force, skip=args.skip, incremental=args.incremental,
+                     neo4j_sync=args.neo4j_sync, svg_dir=args.svg_dir)
+
+if __name__ == "__main__":
+    main()
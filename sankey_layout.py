@@ -0,0 +1,302 @@
+# sankey_layout.py
+# a Python port of the d3-sankey 0.12.3 layout, so build_d3 can store node positions and link widths
+# in the theme shards instead of the page computing them on every load.
+
+import math
+import functools
+
+# Layout settings used by sankey-diagram.js: an 1100x600 SVG with 10px margins, leaving 150px for labels
+SANKEY_EXTENT = ((1, 1), (1080 - 150, 580 - 6))
+NODE_WIDTH = 30
+NODE_PADDING = 10
+ITERATIONS = 6
+
+class _Node:
+    __slots__ = ('index', 'source_links', 'target_links', 'value', 'depth', 'height', 'layer', 'x0', 'x1', 'y0', 'y1')
+
+    def __init__(self, index):
+        self.index = index
+        self.source_links = []
+        self.target_links = []
+        # Unpositioned nodes compare like JavaScript's undefined
+        self.y0 = self.y1 = math.nan
+
+class _Link:
+    __slots__ = ('index', 'source', 'target', 'value', 'width', 'y0', 'y1')
+
+    def __init__(self, index, source, target, value):
+        self.index = index
+        self.source = source
+        self.target = target
+        self.value = value
+
+def _divide(numerator, denominator):
+    """
+    Divide with JavaScript semantics, where dividing by zero gives +/-Infinity or NaN instead of raising.
+    """
+    if denominator:
+        return numerator / denominator
+    if numerator == 0 or math.isnan(numerator):
+        return math.nan
+    return math.copysign(math.inf, numerator) * math.copysign(1, denominator)
+
+def _number(value):
+    """
+    Coerce a link value like JavaScript arithmetic does: null counts as 0.
+    """
+    return 0 if value is None else value
+
+def ascending_breadth(a, b):
+    return a.y0 - b.y0
+
+def _breadth_or_index(difference, a, b):
+    # JavaScript's `difference || a.index - b.index`, where NaN and 0 fall through to the index
+    return difference if difference and not math.isnan(difference) else a.index - b.index
+
+@functools.cmp_to_key
+def _source_breadth_key(a, b):
+    return _breadth_or_index(ascending_breadth(a.source, b.source), a, b)
+
+@functools.cmp_to_key
+def _target_breadth_key(a, b):
+    return _breadth_or_index(ascending_breadth(a.target, b.target), a, b)
+
+def first_target_node_sort(links):
+    """
+    The nodeSort used by sankey-diagram.js: nodes are ordered by the target of their first outbound
+    link, with nodes that have no outbound links last. Returns a comparator for the layout.
+    """
+    first_targets = {}
+    for link in links:
+        first_targets.setdefault(link['source'], link['target'])
+
+    def compare(a, b):
+        a_target = first_targets.get(a.index)
+        b_target = first_targets.get(b.index)
+        if a_target is None and b_target is None:
+            return 0
+        if a_target is None:
+            return 1
+        if b_target is None:
+            return -1
+        return (a_target > b_target) - (a_target < b_target)
+
+    return compare
+
+def compute_sankey_layout(nodes, links, extent=SANKEY_EXTENT, node_width=NODE_WIDTH, node_padding=NODE_PADDING,
+                          iterations=ITERATIONS, node_sort=None):
+    """
+    Lay out a Sankey diagram exactly as d3.sankey() does with the justify alignment, the default
+    link sort and the given node_sort comparator (node objects with .index; None keeps d3's default
+    of sorting columns by position). links refer to nodes by index, as in build_d3's theme shards.
+    Returns (node_layouts, link_layouts): per node its value, depth, height, layer, x0/x1/y0/y1
+    and the indices of its outbound and inbound links in drawing order; per link its width and
+    y0/y1. Raises ValueError on circular links, like d3-sankey.
+    """
+    (x0, y0), (x1, y1) = extent
+    dx = node_width
+    dy = node_padding
+
+    # computeNodeLinks
+    graph_nodes = [_Node(i) for i in range(len(nodes))]
+    graph_links = []
+    for i, link in enumerate(links):
+        source, target = graph_nodes[link['source']], graph_nodes[link['target']]
+        graph_link = _Link(i, source, target, link['value'])
+        source.source_links.append(graph_link)
+        target.target_links.append(graph_link)
+        graph_links.append(graph_link)
+
+    # computeNodeValues
+    for node in graph_nodes:
+        node.value = max(sum(_number(link.value) for link in node.source_links),
+                         sum(_number(link.value) for link in node.target_links))
+
+    # computeNodeDepths and computeNodeHeights
+    def assign_levels(attribute, neighbors):
+        current = list(graph_nodes)
+        level = 0
+        while current:
+            following = {}
+            for node in current:
+                setattr(node, attribute, level)
+                for neighbor in neighbors(node):
+                    following[neighbor.index] = neighbor
+            level += 1
+            if level > len(graph_nodes):
+                raise ValueError("circular link")
+            current = list(following.values())
+
+    assign_levels('depth', lambda node: [link.target for link in node.source_links])
+    assign_levels('height', lambda node: [link.source for link in node.target_links])
+
+    # computeNodeLayers, with sankeyJustify alignment
+    num_layers = max((node.depth for node in graph_nodes), default=-1) + 1
+    kx = _divide(x1 - x0 - dx, num_layers - 1)
+    columns = [[] for _ in range(num_layers)]
+    for node in graph_nodes:
+        aligned = node.depth if node.source_links else num_layers - 1
+        layer = max(0, min(num_layers - 1, math.floor(aligned)))
+        node.layer = layer
+        node.x0 = x0 + layer * kx
+        node.x1 = node.x0 + dx
+        columns[layer].append(node)
+    if node_sort is not None:
+        for column in columns:
+            column.sort(key=functools.cmp_to_key(node_sort))
+
+    def reorder_links(column):
+        for node in column:
+            node.source_links.sort(key=_target_breadth_key)
+            node.target_links.sort(key=_source_breadth_key)
+
+    def reorder_node_links(node):
+        for link in node.target_links:
+            link.source.source_links.sort(key=_target_breadth_key)
+        for link in node.source_links:
+            link.target.target_links.sort(key=_source_breadth_key)
+
+    # computeNodeBreadths
+    py = min(dy, _divide(y1 - y0, max((len(column) for column in columns), default=0) - 1))
+
+    # initializeNodeBreadths
+    ky_candidates = [_divide(y1 - y0 - (len(column) - 1) * py, sum(node.value for node in column)) for column in columns]
+    ky = min((candidate for candidate in ky_candidates if not math.isnan(candidate)), default=math.nan)
+    for column in columns:
+        y = y0
+        for node in column:
+            node.y0 = y
+            node.y1 = y + node.value * ky
+            y = node.y1 + py
+            for link in node.source_links:
+                link.width = _number(link.value) * ky
+        y = (y1 - y + py) / (len(column) + 1)
+        for i, node in enumerate(column):
+            node.y0 += y * (i + 1)
+            node.y1 += y * (i + 1)
+        reorder_links(column)
+
+    def target_top(source, target):
+        # The target.y0 that would produce an ideal link from source to target
+        y = source.y0 - (len(source.source_links) - 1) * py / 2
+        for link in source.source_links:
+            if link.target is target:
+                break
+            y += link.width + py
+        for link in target.target_links:
+            if link.source is source:
+                break
+            y -= link.width
+        return y
+
+    def source_top(source, target):
+        # The source.y0 that would produce an ideal link from source to target
+        y = target.y0 - (len(target.target_links) - 1) * py / 2
+        for link in target.target_links:
+            if link.source is source:
+                break
+            y += link.width + py
+        for link in source.source_links:
+            if link.target is target:
+                break
+            y -= link.width
+        return y
+
+    def resolve_collisions_top_to_bottom(column, y, i, alpha):
+        # Push any overlapping nodes down
+        for node in column[i:]:
+            shift = (y - node.y0) * alpha
+            if shift > 1e-6:
+                node.y0 += shift
+                node.y1 += shift
+            y = node.y1 + py
+
+    def resolve_collisions_bottom_to_top(column, y, i, alpha):
+        # Push any overlapping nodes up
+        for node in reversed(column[:i + 1]):
+            shift = (node.y1 - y) * alpha
+            if shift > 1e-6:
+                node.y0 -= shift
+                node.y1 -= shift
+            y = node.y0 - py
+
+    def resolve_collisions(column, alpha):
+        i = len(column) >> 1
+        subject = column[i]
+        resolve_collisions_bottom_to_top(column, subject.y0 - py, i - 1, alpha)
+        resolve_collisions_top_to_bottom(column, subject.y1 + py, i + 1, alpha)
+        resolve_collisions_bottom_to_top(column, y1, len(column) - 1, alpha)
+        resolve_collisions_top_to_bottom(column, y0, 0, alpha)
+
+    def relax(column, alpha, beta, links_of, ideal_top):
+        # Reposition each node towards the weighted ideal position implied by its links
+        for node in column:
+            y = 0
+            w = 0
+            for link in links_of(node):
+                v = _number(link.value) * (link.target.layer - link.source.layer)
+                y += ideal_top(link.source, link.target) * v
+                w += v
+            if not w > 0:
+                continue
+            shift = (y / w - node.y0) * alpha
+            node.y0 += shift
+            node.y1 += shift
+            reorder_node_links(node)
+        if node_sort is None:
+            column.sort(key=functools.cmp_to_key(ascending_breadth))
+        resolve_collisions(column, beta)
+
+    for i in range(iterations):
+        alpha = 0.99 ** i
+        beta = max(1 - alpha, (i + 1) / iterations)
+        # relaxRightToLeft: position nodes by their outbound links
+        for column in columns[-2::-1]:
+            relax(column, alpha, beta, lambda node: node.source_links, source_top)
+        # relaxLeftToRight: position nodes by their inbound links
+        for column in columns[1:]:
+            relax(column, alpha, beta, lambda node: node.target_links, target_top)
+
+    # computeLinkBreadths
+    for node in graph_nodes:
+        y_out = y_in = node.y0
+        for link in node.source_links:
+            link.y0 = y_out + link.width / 2
+            y_out += link.width
+        for link in node.target_links:
+            link.y1 = y_in + link.width / 2
+            y_in += link.width
+
+    node_layouts = [{
+        'value': node.value,
+        'depth': node.depth,
+        'height': node.height,
+        'layer': node.layer,
+        'x0': node.x0,
+        'x1': node.x1,
+        'y0': node.y0,
+        'y1': node.y1,
+        'sourceLinks': [link.index for link in node.source_links],
+        'targetLinks': [link.index for link in node.target_links],
+    } for node in graph_nodes]
+    link_layouts = [{'width': link.width, 'y0': link.y0, 'y1': link.y1} for link in graph_links]
+    return node_layouts, link_layouts
+
+def add_sankey_layout(graph):
+    """
+    Lay out a theme's {nodes, links} with the settings of sankey-diagram.js, adding the layout fields
+    to every node and link and recording the settings under 'layout'. Raises ValueError on cycles, and
+    when the positions are not finite numbers (every link value null or zero), leaving graph unchanged.
+    """
+    node_layouts, link_layouts = compute_sankey_layout(graph['nodes'], graph['links'],
+                                                       node_sort=first_target_node_sort(graph['links']))
+    positions = [layout[field] for layout in node_layouts for field in ('x0', 'x1', 'y0', 'y1')]
+    positions += [layout[field] for layout in link_layouts for field in ('width', 'y0', 'y1')]
+    if not all(math.isfinite(position) for position in positions):
+        raise ValueError("layout is not finite; the links have no positive values")
+    for node, layout in zip(graph['nodes'], node_layouts):
+        node.update(layout)
+    for link, layout in zip(graph['links'], link_layouts):
+        link.update(layout)
+    graph['layout'] = {'extent': [list(corner) for corner in SANKEY_EXTENT], 'nodeWidth': NODE_WIDTH, 'nodePadding': NODE_PADDING}
+    return graph
@@ -1,49 +1,303 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-import time
-
-# this code doesn't work. it renders each svg, but not enough style is embedded in the svg to make it look like the original
-# the original svg is rendered by the browser, and the browser applies the css to the svg
-# the svg is not a static image, it is a dynamic image that is rendered by the browser
-# need to address this in the future
-
-# Set up the webdriver
-driver = webdriver.Chrome()
-
-# Navigate to your local server URL
-driver.get('http://localhost:8000/sankey-diagram.html')
-
-# Wait for the page to load completely
-time.sleep(5)
-
-# Find all the h2 elements (for themes)
-themes = driver.find_elements(By.TAG_NAME, 'h2')
-
-# Find all the SVG elements
-svgs = driver.find_elements(By.TAG_NAME, 'svg')
-
-# Ensure each theme has two SVGs (diagram and legend)
-if len(themes) * 2 != len(svgs):
-    print("Error: The number of SVGs and themes do not match the expected 2 SVGs per theme!")
-else:
-    # Loop through each theme and its corresponding two SVGs
-    for i, theme in enumerate(themes):
-        # Get the theme text and sanitize it for a filename
-        theme_text = theme.text.replace('Sankey Diagram for Theme: ', '').replace(' ', '_').replace(':', '')
-
-        # Save the first SVG (diagram)
-        diagram_svg = svgs[i * 2]
-        diagram_filename = f"sankey_diagram_{theme_text}.svg"
-        with open(diagram_filename, "w") as file:
-            file.write(diagram_svg.get_attribute('outerHTML'))
-        print(f"Saved: {diagram_filename}")
-
-        # Save the second SVG (legend)
-        legend_svg = svgs[i * 2 + 1]
-        legend_filename = f"sankey_legend_{theme_text}.svg"
-        with open(legend_filename, "w") as file:
-            file.write(legend_svg.get_attribute('outerHTML'))
-        print(f"Saved: {legend_filename}")
-
-# Close the browser
-driver.quit()
+# save_svgs.py
+# renders the Sankey diagram and legend of every theme to standalone SVG files, without a browser.
+# reads the theme shards written by build_d3.py and draws them the way sankey-diagram.js does,
+# with the page's CSS embedded so the files look the same outside the page.
+
+import os
+import re
+import math
+import json
+import argparse
+import decimal
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape, quoteattr
+from build_d3 import FLOW_SHARD_DIR, MANIFEST_FILE
+from sankey_layout import add_sankey_layout, NODE_WIDTH
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Page holding the CSS embedded in every SVG
+PAGE_FILE = 'sankey-diagram.html'
+
+# Diagram size and margins, as in sankey-diagram.js
+MARGIN = 10
+WIDTH = 1100 - 2 * MARGIN
+HEIGHT = 600 - 2 * MARGIN
+
+# d3.schemeTableau10
+TABLEAU10 = ['#4e79a7', '#f28e2c', '#e15759', '#76b7b2', '#59a14f', '#edc949', '#af7aa1', '#ff9da7', '#9c755f', '#bab0ab']
+
+def read_page_css(page_file=PAGE_FILE):
+    """
+    Return the contents of the <style> element of the Sankey page.
+    """
+    with open(page_file) as f:
+        match = re.search(r'<style>(.*?)</style>', f.read(), re.DOTALL)
+    return match.group(1).strip() if match else ''
+
+def js_number(value):
+    """
+    Format a number the way JavaScript converts it to a string, as d3 does for attributes and paths.
+    """
+    if value is None or math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+    if value == int(value) and abs(value) < 1e21:
+        return str(int(value))
+    text = repr(float(value))
+    if 'e' in text:
+        mantissa, exponent = text.split('e')
+        exponent = int(exponent)
+        if -7 < exponent < 21:
+            return format(decimal.Decimal(text), 'f')
+        return f"{mantissa}e{'+' if exponent > 0 else '-'}{abs(exponent)}"
+    return text
+
+def js_string(value):
+    """
+    Format a value the way a JavaScript template literal does, so missing fields read 'null' as on the page.
+    """
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return js_number(value)
+    return str(value)
+
+def to_fixed(value, digits=2):
+    """
+    JavaScript's Number.prototype.toFixed, which rounds the exact binary value half up (null counts as 0).
+    """
+    exact = decimal.Decimal(0 if value is None else value)
+    return str(exact.quantize(decimal.Decimal(1).scaleb(-digits), rounding=decimal.ROUND_HALF_UP))
+
+def darker(color, k=0.5):
+    """
+    d3.color(color).darker(k) as an rgb() string, or None when there is no color.
+    """
+    if color is None:
+        return None
+    factor = 0.7 ** k
+    channels = [int(color[i:i + 2], 16) * factor for i in (1, 3, 5)]
+    return "rgb({}, {}, {})".format(*(max(0, min(255, math.floor(channel + 0.5))) for channel in channels))
+
+def element(tag, attributes, content=None):
+    """
+    Serialize an SVG element; attributes whose value is None are left out, like d3's attr(name, null).
+    """
+    attrs = ''.join(f" {name}={quoteattr(value if isinstance(value, str) else js_number(value))}"
+                    for name, value in attributes if value is not None)
+    if content is None:
+        return f"<{tag}{attrs}/>"
+    return f"<{tag}{attrs}>{content}</{tag}>"
+
+def theme_graph(shard):
+    """
+    Return the theme's nodes and links with the precomputed layout, computing it when the shard has none.
+    Links' source and target are replaced by their node dicts.
+    """
+    if not shard.get('layout'):
+        add_sankey_layout(shard)
+    nodes, links = shard['nodes'], shard['links']
+    for link in links:
+        link['source'] = nodes[link['source']]
+        link['target'] = nodes[link['target']]
+    for node in nodes:
+        node['sourceLinks'] = [links[i] for i in node['sourceLinks']]
+    return nodes, links
+
+def render_diagram(nodes, links, css):
+    """
+    Draw the Sankey diagram SVG of one theme.
+    """
+    # Target nodes get a Tableau10 color in the order the page first asks the ordinal scale for them
+    target_colors = {}
+    for node in nodes:
+        if node['fundingIn'] > 0 and node['name'] not in target_colors:
+            target_colors[node['name']] = TABLEAU10[len(target_colors) % len(TABLEAU10)]
+
+    link_elements = []
+    for link in links:
+        x0, x1 = link['source']['x1'], link['target']['x0']
+        xm = (x0 + x1) / 2
+        path = f"M{js_number(x0)},{js_number(link['y0'])}C{js_number(xm)},{js_number(link['y0'])},{js_number(xm)},{js_number(link['y1'])},{js_number(x1)},{js_number(link['y1'])}"
+        title = (f"{js_string(link['source']['source_name'])} → {js_string(link['target']['name'])}\n"
+                 f"Source Org: {js_string(link['source']['source_org'])}\n"
+                 f"Value: ${to_fixed(link['value'])}M\n"
+                 f"Companies: {js_string(link['source_companies'] or 'No companies available')}\n"
+                 f"Description: {js_string(link['source_description'] or 'No description available')}")
+        link_elements.append(element('path', [
+            ('class', 'link'),
+            ('d', path),
+            ('style', f"stroke-width: {js_number(max(1, link['width']))}px;"),
+        ], element('title', [], escape(title))))
+
+    half_width = NODE_WIDTH / 2
+    node_elements = []
+    for node in nodes:
+        base_height = node['y1'] - node['y0']
+        is_final = not node['sourceLinks']
+        target_node = node['sourceLinks'][0]['target'] if node['sourceLinks'] else node
+        target_color = target_colors.get(target_node['name'])
+
+        if node['fundingOut'] > node['fundingIn']:
+            in_height = node['fundingIn'] / node['fundingOut'] * base_height
+        else:
+            in_height = base_height
+        if is_final:
+            out_height = 0
+        elif node['fundingOut'] > node['fundingIn']:
+            out_height = base_height
+        else:
+            out_height = node['fundingOut'] / node['fundingIn'] * base_height if node['fundingIn'] else math.nan
+
+        parts = [
+            element('rect', [('class', 'in-bar'), ('x', 0), ('height', in_height), ('width', half_width),
+                             ('fill', target_color), ('opacity', 0.7)]),
+            element('rect', [('class', 'out-bar'), ('x', half_width), ('height', out_height), ('width', half_width),
+                             ('fill', darker(target_color)), ('opacity', 0.7)]),
+        ]
+
+        # Final nodes wrap their target funding into columns of bars as tall as the node
+        if is_final and base_height > 0 and node['fundingIn'] > 0:
+            total_height = (node['targetFunding'] or 0) / node['fundingIn'] * base_height
+            for i in range(math.ceil(total_height / base_height)):
+                bar_height = min(base_height, total_height - i * base_height)
+                parts.append(element('rect', [
+                    ('class', 'out-bar-segment'),
+                    ('x', half_width + i * NODE_WIDTH),
+                    ('y', -1 * bar_height + base_height),
+                    ('height', bar_height),
+                    ('width', half_width),
+                    ('fill', darker(target_colors.get(node['name']))),
+                    ('opacity', 0.7),
+                ]))
+
+        left = node['x0'] < WIDTH / 2
+        parts.append(element('text', [
+            ('x', 6 + NODE_WIDTH if left else -6),
+            ('y', base_height / 2),
+            ('dy', '0.35em'),
+            ('text-anchor', 'start' if left else 'end'),
+        ], escape(js_string(node['name']))))
+
+        title = (f"{js_string(node['source_name'])}\n"
+                 f"Description: {js_string(node['source_description'] or 'No description available')}\n"
+                 f"Companies: {js_string(node['source_companies'] or 'No companies available')}\n"
+                 f"Source Org: {js_string(node['source_org'])}\n"
+                 f"Total Funding In: ${to_fixed(node['fundingIn'])}M\n"
+                 f"Total Funding Out: ${to_fixed(node['fundingOut'])}M\n"
+                 f"Target Funding: ${to_fixed(node['targetFunding'])}M")
+        parts.append(element('title', [], escape(title)))
+
+        node_elements.append(element('g', [
+            ('class', 'node'),
+            ('transform', f"translate({js_number(node['x0'])},{js_number(node['y0'])})"),
+        ], ''.join(parts)))
+
+    body = element('g', [('transform', f"translate({MARGIN},{MARGIN})")],
+                   element('g', [], ''.join(link_elements)) + element('g', [], ''.join(node_elements)))
+    return svg_document(WIDTH + 2 * MARGIN, HEIGHT + 2 * MARGIN, css, body)
+
+def render_legend(nodes, css):
+    """
+    Draw the legend SVG of one theme: a bar as tall as a node worth 100M.
+    """
+    max_value = max(node['value'] for node in nodes)
+    max_height = max(node['y1'] - node['y0'] for node in nodes)
+    legend_height = 100 * (max_height / max_value if max_value else math.nan)
+
+    body = element('g', [], element('rect', [
+        ('width', NODE_WIDTH), ('height', legend_height), ('fill', '#ccc'), ('opacity', 0.7),
+    ]) + element('text', [
+        ('x', NODE_WIDTH + 10), ('y', legend_height / 2), ('dy', '0.35em'),
+    ], '100M Value'))
+    return svg_document(200, legend_height + 40, css, body, css_class='legend')
+
+def svg_document(width, height, css, body, css_class=None):
+    """
+    Wrap SVG content in a standalone document with the page CSS embedded.
+    """
+    attributes = [('xmlns', 'http://www.w3.org/2000/svg'), ('width', width), ('height', height), ('class', css_class)]
+    return element('svg', attributes, element('style', [], escape(css)) + body) + '\n'
+
+def svg_file_names(theme, used_names=None):
+    """
+    Return the diagram and legend file names of a theme, as the Selenium export named them, with
+    characters that are not allowed in file names replaced by '_'. With used_names, a numeric suffix
+    keeps the names unique among the themes rendered so far.
+    """
+    theme_text = js_string(theme).replace(' ', '_').replace(':', '')
+    theme_text = re.sub(r'[/\\<>"|?*\x00-\x1f]', '_', theme_text)
+    if used_names is not None:
+        base, suffix = theme_text, 2
+        while theme_text in used_names:
+            theme_text = f"{base}_{suffix}"
+            suffix += 1
+        used_names.add(theme_text)
+    return f"sankey_diagram_{theme_text}.svg", f"sankey_legend_{theme_text}.svg"
+
+def render_theme(shard_path, output_dir, css, file_names):
+    """
+    Render one theme shard to its diagram and legend SVG files. Returns the written paths.
+    """
+    with open(shard_path) as f:
+        shard = json.load(f)
+    nodes, links = theme_graph(shard)
+
+    paths = []
+    for file_name, document in zip(file_names, (render_diagram(nodes, links, css), render_legend(nodes, css))):
+        path = os.path.join(output_dir, file_name)
+        with open(path, 'w') as f:
+            f.write(document)
+        paths.append(path)
+    return paths
+
+def save_svgs(shard_dir=FLOW_SHARD_DIR, output_dir='.', workers=None, page_file=PAGE_FILE):
+    """
+    Render every theme listed in the shard manifest, one theme per worker process.
+    Returns the written paths.
+    """
+    with open(os.path.join(shard_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    css = read_page_css(page_file)
+    os.makedirs(output_dir, exist_ok=True)
+
+    written = []
+    used_names = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            entry['theme']: executor.submit(render_theme, os.path.join(shard_dir, entry['file']), output_dir, css,
+                                            svg_file_names(entry['theme'], used_names))
+            for entry in manifest['themes']
+        }
+        for theme, future in futures.items():
+            try:
+                paths = future.result()
+            except (ValueError, OSError) as e:
+                # Themes d3-sankey cannot lay out (a cycle) or whose files cannot be written are skipped
+                logging.error(f"Could not render theme {theme!r}: {e}")
+                continue
+            for path in paths:
+                print(f"Saved: {path}")
+            written.extend(paths)
+    return written
+
+def main(argv=None):
+    """
+    Render the Sankey diagram and legend SVGs of every theme.
+    """
+    parser = argparse.ArgumentParser(description="Render the per-theme Sankey diagrams to standalone SVG files.")
+    parser.add_argument('--shard-dir', default=FLOW_SHARD_DIR, help="Directory with the theme shards written by build_d3.py.")
+    parser.add_argument('--output-dir', default='.', help="Directory the SVG files are written to.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU).")
+    args = parser.parse_args(argv)
+
+    save_svgs(args.shard_dir, args.output_dir, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# test_atomic_files.py
+# atomic file writes: the destination only ever holds a complete file.
+
+import json
+import pytest
+from atomic_files import atomic_open, write_json
+
+def test_write_json_creates_the_directory(tmp_path):
+    path = tmp_path / 'cache' / 'state.json'
+    write_json(str(path), {'a': 1}, indent=4)
+
+    assert json.loads(path.read_text()) == {'a': 1}
+    assert [p.name for p in path.parent.iterdir()] == ['state.json']
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = tmp_path / 'flow_data.json'
+    path.write_text('old')
+    with pytest.raises(RuntimeError):
+        with atomic_open(str(path)) as f:
+            f.write('partial')
+            raise RuntimeError("interrupted")
+
+    assert path.read_text() == 'old'
+    assert [p.name for p in tmp_path.iterdir()] == ['flow_data.json']
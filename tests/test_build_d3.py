@@ -0,0 +1,37 @@
+# test_build_d3.py
+# flow_data.json and the per-theme shards written by build_d3.
+
+import os
+import json
+import pandas as pd
+from build_d3 import FLOW_FIELDS, MANIFEST_FILE, write_flow_data
+
+def edges(rows):
+    df = pd.DataFrame(rows)
+    for field in FLOW_FIELDS:
+        if field not in df:
+            df[field] = float('nan') if field.endswith('funding') else None
+    return df
+
+def load_strict_json(path):
+    def reject(token):
+        raise ValueError(f"{token} is not valid JSON")
+    with open(path) as f:
+        return json.load(f, parse_constant=reject)
+
+def test_theme_without_link_values_has_no_layout(tmp_path):
+    chunk = edges([
+        {'source': 'a', 'target': 'b', 'value': float('nan'), 'source_theme': 't'},
+        {'source': 'b', 'target': 'c', 'value': 0.0, 'source_theme': 't'},
+        {'source': 'd', 'target': 'e', 'value': 5.0, 'source_theme': 'u'},
+    ])
+    shard_dir = str(tmp_path / 'flow_data')
+    count = write_flow_data([chunk], str(tmp_path / 'flow_data.json'), shard_dir=shard_dir)
+
+    assert count == 3
+    assert len(load_strict_json(tmp_path / 'flow_data.json')) == 3
+    unlaid = load_strict_json(os.path.join(shard_dir, 't.json'))
+    assert unlaid['layout'] is None
+    assert 'y0' not in unlaid['nodes'][0]
+    assert load_strict_json(os.path.join(shard_dir, 'u.json'))['layout'] is not None
+    assert load_strict_json(os.path.join(shard_dir, MANIFEST_FILE))['edges'] == 3
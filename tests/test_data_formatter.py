@@ -0,0 +1,81 @@
+# test_data_formatter.py
+# dependency token parsing, row hashing and the incremental diffs in data_formatter.
+
+import logging
+import pandas as pd
+from data_formatter import parse_program_dependencies, prepare_all_programs_dataframe, diff_program_rows, diff_id_pairs
+
+def pairs(df):
+    return sorted(zip(df['program_id'].tolist(), df['dependency_id'].tolist()))
+
+def test_parses_signed_padded_and_duplicate_tokens():
+    df = pd.DataFrame({'id': [1, 2, 2, 3], 'dependency': ['2, 3,,', ' +3 ,003', ' +3 ,003', '-4']})
+    result = parse_program_dependencies(df)
+
+    assert result['dependency_id'].dtype == 'int64'
+    assert pairs(result) == [(1, 2), (1, 3), (2, 3), (3, -4)]
+
+def test_skips_invalid_tokens_with_a_warning(caplog):
+    df = pd.DataFrame({'id': [1, 2, 3], 'dependency': ['2, abc, 1.5, 1e3', '١٢, 3', '99999999999999999999, 9223372036854775807']})
+    with caplog.at_level(logging.WARNING):
+        result = parse_program_dependencies(df)
+
+    assert pairs(result) == [(1, 2), (2, 3)]
+    for token in ['abc', '1.5', '1e3', '١٢', '99999999999999999999', '9223372036854775807']:
+        assert f"Invalid dependency ID: '{token}'" in caplog.text
+
+def test_keeps_large_ids_exact():
+    df = pd.DataFrame({'id': [1, 1], 'dependency': ['9007199254740993', 'x']})
+
+    assert pairs(parse_program_dependencies(df)) == [(1, 9007199254740993)]
+
+def test_rows_without_dependencies():
+    df = pd.DataFrame({'id': [1, 2], 'dependency': [None, '']})
+    result = parse_program_dependencies(df)
+
+    assert result.empty
+    assert list(result.dtypes) == ['int64', 'int64']
+
+def sheet(funding):
+    return pd.DataFrame({
+        'id': [str(i) for i in range(1, len(funding) + 1)],
+        'Program Name': [f"Program {i}" for i in range(1, len(funding) + 1)],
+        'Companies': ['A, B'] + [None] * (len(funding) - 1),
+        'Total Funding (m)': funding,
+        'Start Year': ['2020'] * len(funding),
+        'End Year': ['2021'] * len(funding),
+    })
+
+def test_row_hash_does_not_depend_on_other_rows():
+    whole = prepare_all_programs_dataframe(sheet(['5', '10', '20']))
+    # A blank and a decimal cell make the column float64 instead of int64
+    mixed = prepare_all_programs_dataframe(sheet(['5', '', '20.5']))
+
+    assert whole['row_hash'][0] == mixed['row_hash'][0]
+    assert (whole['row_hash'] != mixed['row_hash']).tolist() == [False, True, True]
+
+def test_diff_program_rows():
+    current = prepare_all_programs_dataframe(sheet(['5', '10', '20', '30']))[['id', 'row_hash']]
+    df = prepare_all_programs_dataframe(sheet(['5', '11', '20']))
+    df = pd.concat([df, prepare_all_programs_dataframe(sheet(['1'] * 5)).iloc[[4]]], ignore_index=True)
+    changed_df, removed_ids = diff_program_rows(df, current)
+
+    assert changed_df['id'].tolist() == [2, 5]
+    assert removed_ids == [4]
+
+def test_diff_id_pairs():
+    desired = pd.DataFrame({'program_id': [1, 1, 2], 'company_id': [10, 11, 10]})
+    # Rows read back from an empty table have object dtype
+    current = pd.DataFrame({'program_id': [1, 3], 'company_id': [10, 10]}, dtype=object)
+    missing_df, extra_df = diff_id_pairs(desired, current)
+
+    assert missing_df.values.tolist() == [[1, 11], [2, 10]]
+    assert extra_df.values.tolist() == [[3, 10]]
+
+def test_diff_id_pairs_against_an_empty_table():
+    desired = pd.DataFrame({'program_id': [1], 'dependency_id': [2]})
+    current = pd.DataFrame({'program_id': [], 'dependency_id': []}, dtype=object)
+    missing_df, extra_df = diff_id_pairs(desired, current)
+
+    assert missing_df.values.tolist() == [[1, 2]]
+    assert extra_df.empty
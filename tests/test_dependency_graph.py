@@ -0,0 +1,51 @@
+# test_dependency_graph.py
+# queries of the in-memory dependency graph on a small fixed graph.
+
+import numpy as np
+import pytest
+from dependency_graph import DependencyGraph, DEPENDENTS
+
+# 1 -> 2 -> 3, 1 -> 3, 4 -> 5 -> 4 (a cycle), 6 alone; the edge to 99 references an unknown program
+PROGRAM_IDS = [6, 5, 4, 3, 2, 1]
+EDGES = [(1, 2), (2, 3), (1, 3), (1, 3), (4, 5), (5, 4), (1, 99)]
+
+@pytest.fixture
+def graph():
+    program_id, dependency_id = zip(*EDGES)
+    return DependencyGraph(PROGRAM_IDS, program_id, dependency_id)
+
+def test_unknown_and_duplicate_edges_are_dropped(graph):
+    assert graph.num_programs == 6
+    assert graph.num_edges == 5
+    assert graph.out_degree().to_dict() == {1: 2, 2: 1, 3: 0, 4: 1, 5: 1, 6: 0}
+    assert graph.in_degree().to_dict() == {1: 0, 2: 1, 3: 2, 4: 1, 5: 1, 6: 0}
+
+def test_orphans_sources_and_sinks(graph):
+    assert graph.orphans().tolist() == [6]
+    assert graph.sources().tolist() == [1]
+    assert graph.sinks().tolist() == [3]
+
+def test_neighbors(graph):
+    assert sorted(graph.dependencies(1).tolist()) == [2, 3]
+    assert graph.dependents(3).tolist() == [1, 2]
+    with pytest.raises(KeyError):
+        graph.dependencies(99)
+
+def test_reachability(graph):
+    assert graph.reachable(1).tolist() == [2, 3]
+    assert graph.reachable(3, direction=DEPENDENTS).tolist() == [1, 2]
+    # A start program is only reachable from itself through a cycle
+    assert graph.reachable(4).tolist() == [4, 5]
+    assert graph.is_reachable(1, 3)
+    assert not graph.is_reachable(3, 1)
+
+def test_strongly_connected_components(graph):
+    labels, count = graph.strongly_connected_components()
+    label = dict(zip(graph.ids.tolist(), labels.tolist()))
+
+    assert count == 5
+    assert label[4] == label[5]
+    assert len({label[i] for i in [1, 2, 3, 4, 6]}) == 5
+    # Dependencies complete first, so they get lower labels
+    assert label[3] < label[2] < label[1]
+    assert np.array_equal(np.sort(np.unique(labels)), np.arange(count))
@@ -0,0 +1,127 @@
+# test_get_data.py
+# the sheet cache and load marker of get_data, with local stand-ins for the Google clients.
+
+import pytest
+import get_data
+
+class _Request:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+class FakeDrive:
+    """
+    Drive stand-in that reports the current revision of the spreadsheet.
+    """
+    def __init__(self, revision):
+        self.revision = revision
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields):
+        return _Request({'version': self.revision})
+
+class FakeSheets:
+    """
+    Sheets stand-in that serves the current values and counts the downloads.
+    """
+    def __init__(self, values):
+        self.values_ = values
+        self.downloads = 0
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range):
+        self.downloads += 1
+        return _Request({'values': self.values_})
+
+SHEET = [['id', 'Program Name'], ['1', 'Alpha'], ['2', 'Beta']]
+
+@pytest.fixture
+def sheet(tmp_path, monkeypatch):
+    """
+    Point get_data at fake Google services and record the table rebuilds instead of running them.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('SPREADSHEET_ID', 'sheet-id')
+    monkeypatch.setenv('SHEET_NAME', 'Programs')
+    drive, sheets = FakeDrive('1'), FakeSheets([list(row) for row in SHEET])
+    monkeypatch.setattr(get_data, 'get_google_drive_service', lambda: drive)
+    monkeypatch.setattr(get_data, 'get_google_sheet_service', lambda: sheets)
+    monkeypatch.setattr(get_data, 'get_postgres_engine', lambda: None)
+
+    rebuilds = []
+    monkeypatch.setattr(get_data, 'rebuild_tables_via_staging', lambda df, engine, **kwargs: rebuilds.append(df))
+    return drive, sheets, rebuilds
+
+def test_unchanged_revision_uses_cached_values(sheet, tmp_path):
+    drive, sheets, _ = sheet
+    values, content_hash = get_data.fetch_sheet_values('sheet-id', 'Programs', cache_dir=tmp_path)
+    cached_values, cached_hash = get_data.fetch_sheet_values('sheet-id', 'Programs', cache_dir=tmp_path)
+
+    assert sheets.downloads == 1
+    assert (cached_values, cached_hash) == (values, content_hash)
+
+def test_changed_revision_downloads_and_hashes_content(sheet, tmp_path):
+    drive, sheets, _ = sheet
+    _, first_hash = get_data.fetch_sheet_values('sheet-id', 'Programs', cache_dir=tmp_path)
+
+    # A new revision with the same content keeps the hash
+    drive.revision = '2'
+    _, same_hash = get_data.fetch_sheet_values('sheet-id', 'Programs', cache_dir=tmp_path)
+    drive.revision = '3'
+    sheets.values_ = SHEET + [['3', 'Gamma']]
+    _, changed_hash = get_data.fetch_sheet_values('sheet-id', 'Programs', cache_dir=tmp_path)
+
+    assert sheets.downloads == 3
+    assert same_hash == first_hash
+    assert changed_hash != first_hash
+
+def test_main_skips_rebuild_only_after_a_successful_load(sheet):
+    _, sheets, rebuilds = sheet
+    get_data.main([])
+    get_data.main([])
+
+    assert len(rebuilds) == 1
+    assert sheets.downloads == 1
+    assert rebuilds[0]['id'].tolist() == [1, 2]
+
+def test_failed_rebuild_is_retried_on_the_next_run(sheet, monkeypatch):
+    _, sheets, rebuilds = sheet
+
+    def failing_rebuild(df, engine, **kwargs):
+        raise RuntimeError("lost connection")
+
+    monkeypatch.setattr(get_data, 'rebuild_tables_via_staging', failing_rebuild)
+    with pytest.raises(RuntimeError):
+        get_data.main([])
+
+    monkeypatch.setattr(get_data, 'rebuild_tables_via_staging', lambda df, engine, **kwargs: rebuilds.append(df))
+    get_data.main([])
+
+    assert len(rebuilds) == 1
+    assert sheets.downloads == 1
+
+def test_fingerprint_does_not_count_as_a_load(sheet):
+    _, sheets, rebuilds = sheet
+    content_hash = get_data.get_sheet_fingerprint()
+    get_data.main([])
+
+    assert len(rebuilds) == 1
+    assert sheets.downloads == 1
+    assert get_data.get_loaded_hash('sheet-id', 'Programs') == content_hash
+
+def test_rebuild_flag_rebuilds_without_downloading(sheet):
+    _, sheets, rebuilds = sheet
+    get_data.main([])
+    get_data.main(['--rebuild'])
+
+    assert len(rebuilds) == 2
+    assert sheets.downloads == 1
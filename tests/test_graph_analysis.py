@@ -0,0 +1,50 @@
+# test_graph_analysis.py
+# cycles, topological depth and critical path of graph_analysis on a small fixed graph.
+
+import pandas as pd
+import pytest
+from dependency_graph import DependencyGraph
+from graph_analysis import analyze_graph, format_report
+
+# 1 -> 2 -> 3, and 6 -> 4 <-> 5 (a cycle)
+PROGRAMS = pd.DataFrame({
+    'id': [1, 2, 3, 4, 5, 6],
+    'short_name': ['one', 'two', 'three', 'four', 'five', None],
+    'total_funding_m': [10, 1, 5, 3, 4, 20],
+})
+EDGES = [(1, 2), (2, 3), (6, 4), (4, 5), (5, 4)]
+
+@pytest.fixture
+def result():
+    program_id, dependency_id = zip(*EDGES)
+    return analyze_graph(DependencyGraph(PROGRAMS['id'], program_id, dependency_id), PROGRAMS)
+
+def test_cycles(result):
+    assert result['components'] == 5
+    assert len(result['cycles']) == 1
+    cycle = result['cycles'][0]
+    assert cycle['size'] == 2
+    assert sorted(program['id'] for program in cycle['programs']) == [4, 5]
+    # The example cycle starts and ends at the same program
+    example = [program['id'] for program in cycle['example']]
+    assert example[0] == example[-1] and sorted(example[:-1]) == [4, 5]
+
+def test_depth(result):
+    depth = dict(zip(result['depth']['id'], result['depth']['depth']))
+
+    assert depth == {1: 2, 2: 1, 3: 0, 4: 0, 5: 0, 6: 1}
+    assert result['max_depth'] == 2
+
+def test_critical_path_counts_every_program_of_a_cycle(result):
+    critical_path = result['critical_path']
+
+    assert critical_path['funding_m'] == 27
+    assert [program['id'] for program in critical_path['programs']][0] == 6
+    assert sorted(program['id'] for program in critical_path['programs'][1:]) == [4, 5]
+
+def test_report_names_unnamed_programs_by_id(result):
+    report = "\n".join(format_report(result))
+
+    assert "Cycles: 1" in report
+    assert "Critical path ($27.00M over 3 programs):" in report
+    assert "#6 -> " in report
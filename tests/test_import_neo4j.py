@@ -0,0 +1,84 @@
+# test_import_neo4j.py
+# partitioning of the relationship rows loaded by concurrent workers, and the neo4j-admin CSV export.
+
+import os
+import csv
+import datetime
+import numpy as np
+import pandas as pd
+from import_neo4j import PROGRAM_PROPERTIES, partition_relationships, export_for_admin_import
+
+def node_sets(partitions, start_label, end_label):
+    return [set((start_label, i) for i in partition.iloc[:, 0]) | set((end_label, i) for i in partition.iloc[:, 1])
+            for partition in partitions]
+
+def assert_disjoint(sets):
+    for i, first in enumerate(sets):
+        for second in sets[i + 1:]:
+            assert not first & second
+
+def test_associations_sharing_a_company_stay_together():
+    df = pd.DataFrame({'program_id': [1, 2, 3, 4, 5], 'company_id': [10, 10, 11, 12, 12]})
+    partitions = partition_relationships(df, 4)
+
+    assert sorted(len(partition) for partition in partitions) == [1, 2, 2]
+    assert_disjoint(node_sets(partitions, 'Program', 'Company'))
+    assert pd.concat(partitions).sort_index().equals(df)
+
+def test_company_and_program_ids_are_separate_nodes():
+    # Program 1 and Company 1 are different nodes, so the two rows are independent
+    df = pd.DataFrame({'program_id': [1, 2], 'company_id': [3, 1]})
+
+    assert len(partition_relationships(df, 2)) == 2
+
+def test_dependency_chains_stay_together():
+    df = pd.DataFrame({'program_id': [1, 2, 3, 5, 7], 'dependency_id': [2, 3, 4, 6, 5]})
+    partitions = partition_relationships(df, 3, same_label=True)
+
+    assert sorted(len(partition) for partition in partitions) == [2, 3]
+    assert_disjoint(node_sets(partitions, 'Program', 'Program'))
+
+def test_empty_rows():
+    assert partition_relationships(pd.DataFrame({'program_id': [], 'company_id': []}), 4) == []
+
+def test_densely_connected_rows_are_split_by_program_ranges():
+    # Every program links to a few of 200 shared companies, so almost all rows form one component
+    rng = np.random.default_rng(0)
+    program_ids = np.repeat(np.arange(2000), rng.integers(1, 5, 2000))
+    df = pd.DataFrame({'program_id': program_ids, 'company_id': rng.integers(0, 200, len(program_ids))}).drop_duplicates()
+    partitions = partition_relationships(df, 4)
+
+    assert len(partitions) == 4
+    assert max(len(partition) for partition in partitions) < len(df) / 2
+    assert_disjoint([set(partition['program_id']) for partition in partitions])
+    assert pd.concat(partitions).sort_index().equals(df)
+
+def read_csv_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+def test_export_for_admin_import(tmp_path):
+    programs = pd.DataFrame({column: [None, None] for column in PROGRAM_PROPERTIES})
+    programs['id'] = [1, 2]
+    programs['program_name'] = ['One', 'Two, with "quotes"\nand a newline']
+    programs['total_funding_m'] = [12.5, np.nan]
+    programs['start_year'] = [datetime.date(2020, 1, 1), None]
+    companies = pd.DataFrame({'id': [10], 'name': ['Acme']})
+    associations = pd.DataFrame({'program_id': [1, 1, 2], 'company_id': [10, 10, 10]})
+    dependencies = pd.DataFrame({'program_id': [2, 2], 'dependency_id': [1, 1]})
+    command = export_for_admin_import(programs, dependencies, associations, companies, export_dir=str(tmp_path))
+
+    program_rows = read_csv_rows(tmp_path / 'programs.csv')
+    header = program_rows[0]
+    assert header[:2] == ['id:ID(Program)', 'program_name']
+    assert {'total_funding_m:double', 'start_year:date', 'end_year:date', 'sync_hash'} <= set(header)
+    first, second = (dict(zip(header, row)) for row in program_rows[1:])
+    assert (first['total_funding_m:double'], first['start_year:date']) == ('12.5', '2020-01-01')
+    # Missing values are empty fields, which neo4j-admin leaves unset
+    assert (second['total_funding_m:double'], second['start_year:date'], second['end_year:date']) == ('', '', '')
+    assert second['program_name'] == 'Two, with "quotes"\nand a newline'
+
+    assert read_csv_rows(tmp_path / 'companies.csv')[0] == ['id:ID(Company)', 'name', 'sync_hash']
+    assert read_csv_rows(tmp_path / 'associated_with.csv') == [[':START_ID(Program)', ':END_ID(Company)'], ['1', '10'], ['2', '10']]
+    assert read_csv_rows(tmp_path / 'depends_on.csv') == [[':START_ID(Program)', ':END_ID(Program)'], ['2', '1']]
+    assert f"--relationships=DEPENDS_ON={os.path.join(str(tmp_path), 'depends_on.csv')}" in command
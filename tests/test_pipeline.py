@@ -0,0 +1,118 @@
+# test_pipeline.py
+# stage skipping, artifact restore and pruning, failure handling and SVG directory handling of the pipeline runner.
+
+import os
+import pytest
+import pipeline
+import get_data
+import save_svgs
+
+class Stage:
+    """
+    A stage that writes one output file per call, with content naming the input it ran for.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.runs = []
+
+    def __call__(self, value):
+        def run():
+            self.runs.append(value)
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, 'out.json'), 'w') as f:
+                f.write(value)
+        return run
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
+
+def test_run_stage_skips_unchanged_key(cache_dir):
+    runs = []
+    state = {}
+    assert pipeline.run_stage('stage', 'a', lambda: runs.append('a'), state, cache_dir=cache_dir)
+    assert not pipeline.run_stage('stage', 'a', lambda: runs.append('a'), state, cache_dir=cache_dir)
+    assert pipeline.run_stage('stage', 'a', lambda: runs.append('a'), state, force=True, cache_dir=cache_dir)
+
+    assert runs == ['a', 'a']
+    assert pipeline.load_state(cache_dir) == {'stage': 'a'}
+
+def test_cached_stage_restores_earlier_outputs(tmp_path, cache_dir):
+    out_dir = str(tmp_path / 'out')
+    stage = Stage(out_dir)
+    outputs = [(out_dir, '*.json')]
+    state = {}
+    for key in ['a', 'b', 'a']:
+        pipeline.run_cached_stage('stage', key, stage(key), outputs, state, cache_dir=cache_dir)
+
+    assert stage.runs == ['a', 'b']
+    assert read(os.path.join(out_dir, 'out.json')) == 'a'
+
+    # Unchanged inputs with the outputs in place do nothing
+    assert not pipeline.run_cached_stage('stage', 'a', stage('a'), outputs, state, cache_dir=cache_dir)
+    assert stage.runs == ['a', 'b']
+
+def test_cached_stage_failure_is_not_recorded(tmp_path, cache_dir):
+    out_dir = str(tmp_path / 'out')
+    state = {}
+
+    def fail():
+        raise RuntimeError("stage failed")
+
+    with pytest.raises(RuntimeError):
+        pipeline.run_cached_stage('stage', 'a', fail, [(out_dir, '*.json')], state, cache_dir=cache_dir)
+
+    assert pipeline.load_state(cache_dir) == {}
+    assert not os.path.exists(os.path.join(cache_dir, 'artifacts', 'stage', 'a'))
+
+    # The next run reruns the stage instead of restoring anything
+    stage = Stage(out_dir)
+    assert pipeline.run_cached_stage('stage', 'a', stage('a'), [(out_dir, '*.json')], state, cache_dir=cache_dir)
+    assert stage.runs == ['a']
+
+def test_artifacts_are_pruned(tmp_path, cache_dir, monkeypatch):
+    monkeypatch.setattr(pipeline, 'KEEP_ARTIFACTS', 2)
+    out_dir = str(tmp_path / 'out')
+    stage = Stage(out_dir)
+    state = {}
+    for key in ['a', 'b', 'c']:
+        pipeline.run_cached_stage('stage', key, stage(key), [(out_dir, '*.json')], state, cache_dir=cache_dir)
+        os.utime(os.path.join(cache_dir, 'artifacts', 'stage', key), (stage.runs.index(key),) * 2)
+
+    assert sorted(os.listdir(os.path.join(cache_dir, 'artifacts', 'stage'))) == ['b', 'c']
+
+def test_svgs_replace_only_the_svg_files(tmp_path, cache_dir, monkeypatch):
+    svg_dir = tmp_path / 'docs'
+    svg_dir.mkdir()
+    (svg_dir / 'index.md').write_text('keep')
+    (svg_dir / 'sankey_diagram_removed.svg').write_text('stale')
+
+    def render(argv):
+        output_dir = argv[argv.index('--output-dir') + 1]
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, 'sankey_diagram_theme.svg'), 'w') as f:
+            f.write('<svg/>')
+
+    monkeypatch.setattr(pipeline, 'get_postgres_engine', lambda: None)
+    monkeypatch.setattr(pipeline, 'table_checksums', lambda engine: {table: table for table in pipeline.LOADED_TABLES})
+    monkeypatch.setattr(save_svgs, 'main', render)
+    pipeline.run_pipeline(skip=['get_data', 'import_neo4j', 'build_d3'], svg_dir=str(svg_dir), cache_dir=cache_dir)
+
+    assert sorted(os.listdir(svg_dir)) == ['index.md', 'sankey_diagram_theme.svg']
+    assert (svg_dir / 'index.md').read_text() == 'keep'
+
+def test_get_data_stage_rebuilds_only_for_a_new_fingerprint(cache_dir, monkeypatch):
+    calls = []
+    monkeypatch.setattr(get_data, 'get_sheet_fingerprint', lambda: 'sheet-hash')
+    monkeypatch.setattr(get_data, 'main', calls.append)
+    monkeypatch.setattr(pipeline, 'get_postgres_engine', lambda: None)
+    monkeypatch.setattr(pipeline, 'table_checksums', lambda engine: {table: table for table in pipeline.LOADED_TABLES})
+    skip = ['import_neo4j', 'build_d3', 'save_svgs']
+    pipeline.run_pipeline(skip=skip, incremental=True, cache_dir=cache_dir)
+    pipeline.run_pipeline(skip=skip, cache_dir=cache_dir)
+
+    assert calls == [['--rebuild', '--incremental']]
@@ -0,0 +1,74 @@
+# test_sankey_layout.py
+# the d3-sankey port on a fixed graph. The expected values come from d3-sankey 0.12.3 run with the
+# settings and nodeSort of sankey-diagram.js.
+
+import pytest
+from sankey_layout import compute_sankey_layout, first_target_node_sort, add_sankey_layout
+
+NODES = [{'name': name} for name in 'abcdef']
+# f only has a null-valued inbound link, so it is justified into the last column with no height
+LINKS = [
+    {'source': 0, 'target': 2, 'value': 30},
+    {'source': 1, 'target': 2, 'value': 10},
+    {'source': 1, 'target': 3, 'value': 20},
+    {'source': 2, 'target': 4, 'value': 25},
+    {'source': 3, 'target': 4, 'value': 15},
+    {'source': 0, 'target': 5, 'value': None},
+]
+
+# layer, x0, y0, y1, sourceLinks, targetLinks
+EXPECTED_NODES = [
+    (0, 1.0, 1.0, 282.5, [0, 5], []),
+    (0, 1.0, 292.5, 574.0, [1, 2], []),
+    (1, 450.5, 1.0, 376.33333333333337, [3], [0, 1]),
+    (1, 450.5, 386.3333333333336, 574.0, [4], [2]),
+    (2, 900.0, 57.43868310808727, 432.7720164414206, [], [3, 4]),
+    (2, 900.0, 511.44444444444446, 511.44444444444446, [], [5]),
+]
+# width, y0, y1
+EXPECTED_LINKS = [
+    (281.5, 141.75, 141.75),
+    (93.83333333333333, 339.41666666666663, 329.4166666666667),
+    (187.66666666666666, 480.1666666666666, 480.1666666666669),
+    (234.58333333333331, 118.29166666666666, 174.73034977475393),
+    (140.75, 456.7083333333336, 362.3970164414206),
+    (0.0, 282.5, 511.44444444444446),
+]
+
+def test_matches_d3_sankey():
+    node_layouts, link_layouts = compute_sankey_layout(NODES, LINKS, node_sort=first_target_node_sort(LINKS))
+
+    for layout, (layer, x0, y0, y1, source_links, target_links) in zip(node_layouts, EXPECTED_NODES):
+        assert layout['layer'] == layer
+        assert (layout['x0'], layout['y0'], layout['y1']) == pytest.approx((x0, y0, y1), abs=1e-9)
+        assert layout['x1'] == pytest.approx(x0 + 30)
+        assert (layout['sourceLinks'], layout['targetLinks']) == (source_links, target_links)
+    for layout, expected in zip(link_layouts, EXPECTED_LINKS):
+        assert (layout['width'], layout['y0'], layout['y1']) == pytest.approx(expected, abs=1e-9)
+
+def test_depth_and_height():
+    node_layouts, _ = compute_sankey_layout(NODES, LINKS)
+
+    assert [layout['depth'] for layout in node_layouts] == [0, 0, 1, 1, 2, 1]
+    assert [layout['height'] for layout in node_layouts] == [2, 2, 1, 1, 0, 0]
+    assert [layout['value'] for layout in node_layouts] == [30, 30, 40, 20, 40, 0]
+
+def test_add_sankey_layout_updates_the_shard():
+    graph = add_sankey_layout({'nodes': [dict(node) for node in NODES], 'links': [dict(link) for link in LINKS]})
+
+    assert graph['layout']['nodeWidth'] == 30
+    assert graph['nodes'][4]['y0'] == pytest.approx(EXPECTED_NODES[4][2])
+    assert graph['links'][0]['width'] == pytest.approx(281.5)
+
+def test_cycles_raise():
+    links = [{'source': 0, 'target': 1, 'value': 1}, {'source': 1, 'target': 0, 'value': 1}]
+    with pytest.raises(ValueError):
+        compute_sankey_layout(NODES[:2], links)
+
+@pytest.mark.parametrize('value', [0, None])
+def test_links_without_values_raise(value):
+    links = [{'source': 0, 'target': 1, 'value': value}, {'source': 1, 'target': 2, 'value': value}]
+    graph = {'nodes': [dict(node) for node in NODES[:3]], 'links': links}
+    with pytest.raises(ValueError):
+        add_sankey_layout(graph)
+    assert 'layout' not in graph
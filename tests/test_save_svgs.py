@@ -0,0 +1,52 @@
+# test_save_svgs.py
+# text formatting of the SVG renderer, which has to match what sankey-diagram.js writes.
+
+import os
+import re
+import pandas as pd
+from build_d3 import FLOW_FIELDS, write_flow_data
+from save_svgs import js_number, js_string, render_diagram, svg_file_names, save_svgs
+
+PAGE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sankey-diagram.html')
+
+def test_numbers_format_like_javascript():
+    assert [js_number(value) for value in [1.0, 0.1, 1e21, 1.5e-7, -0.0]] == ['1', '0.1', '1e+21', '1.5e-7', '0']
+
+def test_missing_values_read_null():
+    assert [js_string(value) for value in [None, True, 2.0, 'x']] == ['null', 'true', '2', 'x']
+    assert svg_file_names(None) == ('sankey_diagram_null.svg', 'sankey_legend_null.svg')
+
+def test_missing_names_and_orgs_render_as_null():
+    source = {'name': None, 'fundingIn': 0, 'fundingOut': 5.0, 'targetFunding': 0, 'source_companies': None,
+              'source_description': None, 'source_name': None, 'source_org': None,
+              'x0': 1, 'x1': 31, 'y0': 1, 'y1': 100}
+    target = dict(source, name='B', fundingIn=5.0, fundingOut=0, x0=900, x1=930)
+    link = {'source': source, 'target': target, 'value': 5.0, 'width': 99, 'y0': 50, 'y1': 50,
+            'source_companies': None, 'source_description': None}
+    source['sourceLinks'], target['sourceLinks'] = [link], []
+
+    svg = render_diagram([source, target], [link], css='')
+    titles = re.findall(r'<title>(.*?)</title>', svg, re.DOTALL)
+
+    assert titles[0].startswith('null → B\nSource Org: null\n')
+    assert 'Companies: No companies available' in titles[0]
+    assert re.findall(r'<text[^>]*>(.*?)</text>', svg) == ['null', 'B']
+
+def test_theme_names_are_safe_file_names():
+    used_names = set()
+
+    assert svg_file_names('Air/Space: Ops', used_names) == ('sankey_diagram_Air_Space_Ops.svg', 'sankey_legend_Air_Space_Ops.svg')
+    assert svg_file_names('Air_Space Ops', used_names)[0] == 'sankey_diagram_Air_Space_Ops_2.svg'
+
+def test_renders_themes_with_slashes(tmp_path):
+    edges = pd.DataFrame({field: [None, None] for field in FLOW_FIELDS})
+    edges['source'], edges['target'] = ['a', 'c'], ['b', 'd']
+    edges['value'] = edges['source_funding'] = edges['target_funding'] = [5.0, 3.0]
+    edges['source_theme'] = ['Air/Space', 'Land']
+    shard_dir = str(tmp_path / 'flow_data')
+    write_flow_data([edges], str(tmp_path / 'flow_data.json'), shard_dir=shard_dir)
+    written = save_svgs(shard_dir, str(tmp_path / 'svgs'), workers=1, page_file=PAGE_FILE)
+
+    assert sorted(os.path.basename(path) for path in written) == [
+        'sankey_diagram_Air_Space.svg', 'sankey_diagram_Land.svg', 'sankey_legend_Air_Space.svg', 'sankey_legend_Land.svg'
+    ]